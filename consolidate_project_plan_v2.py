@@ -4,23 +4,691 @@ Project Documentation Consolidation Script v2
 Enhanced version with better matching and reporting
 """
 
+import argparse
+import array
 import csv
 import glob
+import heapq
 import os
+import sys
 from datetime import datetime, timedelta
-from difflib import SequenceMatcher
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 import re
 
+# difflib, decimal, json, pickle, tempfile, shutil, multiprocessing and
+# match_index are imported where they are used, so quick subcommands
+# (e.g. `match` with a compiled index) start fast.
+
+
+GAP_FILE = 'Gap Termi Community - today - GAP з модулем Appointments (1).csv'
+
+OUTPUT_FIELDNAMES = [
+    'Розділ',
+    'Деталізація',
+    'Тип робіт',
+    'Статус',
+    'Учасники від замовника',
+    'Учасники від виконавця',
+    'Днів на виконання (робочих)',
+    'Дата початку план',
+    'Дата закінчення план',
+    'Дата початку факт',
+    'Дата закінчення факт',
+    'Облік часу (план)',
+    'Облік часу (факт)',
+    'Коментарі'
+]
+
+MATCH_REPORT_FIELDNAMES = ['GAP Feature', 'Sprint Task', 'Match Score', 'Sprint']
+
+# Column carrying the original GAP row number inside shard and part files
+ROW_COLUMN = '_row'
+
+# Internal column carrying the matched sprint task of an activity row
+SPRINT_TASK_COLUMN = '_sprint_task'
+
+# Extra output column written when fact exports are joined
+VARIANCE_COLUMN = 'Відхилення (год)'
+
+# Timesheet / fact export columns (first non-empty column wins)
+FACT_TASK_COLUMNS = ['Задача']
+FACT_DETAIL_COLUMNS = ['Деталізація', 'Вимога']
+FACT_TYPE_COLUMNS = ['Тип робіт']
+FACT_HOURS_COLUMNS = ['Облік часу (факт)', 'Оцінка (год) факт', 'Години']
+FACT_START_COLUMNS = ['Дата початку факт', 'Дата']
+FACT_END_COLUMNS = ['Дата закінчення факт', 'Дата']
+
+# Default score a sprint task has to exceed to count as a match
+MATCH_THRESHOLD = 0.5
+
+# Default checkpoint interval of a resumable run (whichever comes first)
+CHECKPOINT_ROWS = 1000
+CHECKPOINT_SECONDS = 300
+
+# Requirement texts `match` indexes for reverse containment at a time
+MATCH_BATCH_ROWS = 1000
+
+# Common words ignored by keyword matching
+STOP_WORDS = {'та', 'і', 'в', 'на', 'з', 'по', 'для', 'що', 'який', 'яка', 'яке',
+              'від', 'до', 'за', 'про', 'при', 'під', 'над', 'через', 'у'}
+
+# Inflectional endings stripped by stem_word (longest match wins)
+UKRAINIAN_ENDINGS = sorted({
+    # verbal nouns and infinitives; bare "-ати"/"-ити"/... would also cut the
+    # "-т-" of nouns ("оплати" → "опл"), so only "-увати"/"-ювати" are stripped
+    'ування', 'ювання', 'ання', 'яння', 'ення', 'іння', 'увань', 'ювань', 'ань', 'ень',
+    'увати', 'ювати',
+    # verb forms (no past tense "-ла"/"-ли"/"-ло": it splits "школа"/"школу")
+    'ють', 'ять', 'уть', 'ать', 'ить', 'ете', 'ите', 'емо', 'имо',
+    # adjective endings
+    'ього', 'ьому', 'ого', 'ому', 'ими', 'іми', 'ий', 'ій', 'ої', 'их', 'іх', 'им', 'ім',
+    # noun endings
+    'ами', 'ями', 'ові', 'еві', 'єві', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'єм',
+    'ою', 'ею', 'єю', 'ів', 'їв',
+    'а', 'я', 'е', 'є', 'и', 'і', 'ї', 'о', 'у', 'ю', 'й', 'ь',
+}, key=len, reverse=True)
+
+UKRAINIAN_REFLEXIVE = ('ся', 'сь')
+
+# Shortest stem left after stripping an ending
+MIN_STEM_LENGTH = 3
+
+# Distinct words whose stems are cached (the vocabulary is small)
+STEM_CACHE_SIZE = 65536
+
+# Input/output schema; override any part of it with --config schema.json
+DEFAULT_SCHEMA = {
+    'gap_file': GAP_FILE,
+    'sprint_pattern': '*Спринт*.csv',
+    'sprint_number_pattern': r'(\d+)\s+Спринт',
+    'match_threshold': MATCH_THRESHOLD,
+    # Compare keyword stems ("картки" = "картка") instead of raw word forms
+    'stem_keywords': True,
+    'gap_columns': {
+        'feature': 'Вимога',
+        'section': 'Функціонал /Блок',
+        'scope': 'Scope',
+        'coverage': 'Покриття вимоги',
+        'importance': 'Важливість',
+        'ba_hours': 'Оцінка БА (год)',
+        'dev_hours': 'Оцінка Розробників (год)',
+    },
+    'sprint_columns': {
+        'task': 'Задача',
+        'hours': 'Оцінка (год)',
+        'group': 'Група',
+        'start': 'Дата початку спринта',
+        'end': 'Дата завершення спринта',
+        'total_prefix': 'Всього',
+    },
+    'output_columns': {
+        'section': 'Розділ',
+        'detail': 'Деталізація',
+        'work_type': 'Тип робіт',
+        'status': 'Статус',
+        'plan_start': 'Дата початку план',
+        'plan_end': 'Дата закінчення план',
+        'fact_start': 'Дата початку факт',
+        'fact_end': 'Дата закінчення факт',
+        'plan_hours': 'Облік часу (план)',
+        'fact_hours': 'Облік часу (факт)',
+        'comments': 'Коментарі',
+        'variance': VARIANCE_COLUMN,
+    },
+    'output_fieldnames': OUTPUT_FIELDNAMES,
+    'fact_columns': {
+        'task': FACT_TASK_COLUMNS,
+        'detail': FACT_DETAIL_COLUMNS,
+        'work_type': FACT_TYPE_COLUMNS,
+        'hours': FACT_HOURS_COLUMNS,
+        'start': FACT_START_COLUMNS,
+        'end': FACT_END_COLUMNS,
+    },
+    'critical_importance': 'Критично',
+    'critical_status': 'Заплановано',
+    'planned_comment': 'Planned in Sprint {sprint}',
+    'backlog_work_type': 'Backlog',
+    'backlog_comment': 'Not assigned to any sprint - BACKLOG',
+    # First template whose coverage list contains the GAP coverage wins; "*" matches anything.
+    # share = part of the hours and of the sprint duration, offset = start within the sprint
+    'coverage_templates': [
+        {
+            'coverage': ['Розробка', 'Кастомізація'],
+            'activities': [
+                {'work_type': 'Моделювання', 'share': 0.1, 'offset': 0},
+                {'work_type': 'Розробка', 'share': 0.6, 'offset': 0.1},
+                {'work_type': 'Налаштування', 'share': 0.2, 'offset': 0.7},
+                {'work_type': 'Навчання', 'share': 0.1, 'offset': 0.9},
+            ],
+        },
+        {
+            'coverage': '*',
+            'activities': [
+                {'work_type': 'Налаштування', 'share': 0.8, 'offset': 0},
+                {'work_type': 'Навчання', 'share': 0.2, 'offset': 0.8},
+            ],
+        },
+    ],
+}
+
+
+def load_schema(config_file: Optional[str] = None) -> Dict:
+    """DEFAULT_SCHEMA with the sections of a JSON config file applied on top"""
+    import copy
+
+    schema = copy.deepcopy(DEFAULT_SCHEMA)
+
+    if not config_file:
+        return schema
+
+    import json
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        overrides = json.load(f)
+
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(schema.get(key), dict):
+            schema[key].update(value)
+        else:
+            schema[key] = value
+
+    return schema
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem_word(word: str) -> str:
+    """
+    Light suffix-stripping stemmer for lower-case Ukrainian words
+
+    Strips a reflexive particle, then the longest inflectional ending, and
+    drops the fleeting vowel of "-ок"/"-ек" genitive plurals, so e.g.
+    "картка", "картки" and "карток" all become "картк".
+    Words in other scripts are returned unchanged.
+    """
+    stem = word
+
+    for suffix in UKRAINIAN_REFLEXIVE:
+        if stem.endswith(suffix) and len(stem) - len(suffix) > MIN_STEM_LENGTH:
+            stem = stem[:-len(suffix)]
+            break
+
+    for ending in UKRAINIAN_ENDINGS:
+        if stem.endswith(ending) and len(stem) - len(ending) >= MIN_STEM_LENGTH:
+            stem = stem[:-len(ending)]
+            break
+    else:
+        if stem.endswith(('ок', 'ек')) and len(stem) > MIN_STEM_LENGTH + 1:
+            stem = stem[:-2] + stem[-1]
+
+    return stem
+
+
+class FactJoin:
+    """
+    Single-pass hash join of timesheet/fact exports onto activity rows
+
+    The build side only holds one aggregate per plan key
+    (sprint task, Тип робіт), (Деталізація, Тип робіт) and, for fact rows
+    without a work type such as the sprint files' "Оцінка (год) факт", the
+    sprint task alone; fact rows are streamed and folded into those
+    aggregates, so memory does not grow with the size of the fact exports.
+
+    Several activity rows can share a key (e.g. GAP features matched to the
+    same sprint task), so the hours of a key are split between its rows in
+    proportion to their plan hours (evenly when none are planned).
+    """
+
+    def __init__(self, parse_date, schema: Dict = DEFAULT_SCHEMA):
+        self.parse_date = parse_date
+        self.fact_columns = schema['fact_columns']
+        self.output_columns = schema['output_columns']
+        self.aggregates = {}  # key → [hours, first date, last date]
+        self.plan_totals = {}  # key → [plan hours, activity rows]
+        self.fact_rows = 0
+        self.joined_rows = 0
+
+    @staticmethod
+    def first_value(row: Dict, columns: List[str]) -> str:
+        for column in columns:
+            value = (row.get(column) or '').strip()
+            if value:
+                return value
+        return ''
+
+    def plan_keys(self, row: Dict) -> List[Tuple[str, str, str]]:
+        work_type = row.get(self.output_columns['work_type'], '')
+        keys = [('detail', row.get(self.output_columns['detail'], ''), work_type)]
+
+        if row.get(SPRINT_TASK_COLUMN):
+            # None: facts booked on the sprint task without a work type
+            keys[:0] = [('task', row[SPRINT_TASK_COLUMN], work_type), ('task', row[SPRINT_TASK_COLUMN], None)]
+        return keys
+
+    def plan_hours(self, row: Dict) -> float:
+        try:
+            return float(str(row.get(self.output_columns['plan_hours']) or 0).replace(',', '.'))
+        except ValueError:
+            return 0
+
+    def add_plan_row(self, row: Dict):
+        """Register the join keys and plan hours of one activity row (build side)"""
+        plan_hours = self.plan_hours(row)
+
+        for key in self.plan_keys(row):
+            self.aggregates.setdefault(key, None)
+            totals = self.plan_totals.setdefault(key, [0.0, 0])
+            totals[0] += plan_hours
+            totals[1] += 1
+
+    def scan(self, fact_files: List[str]):
+        """Stream fact exports and aggregate rows matching a plan key (probe side)"""
+        for fact_file in fact_files:
+            print(f"  Joining facts: {fact_file}")
+
+            try:
+                with open(fact_file, 'r', encoding='utf-8') as f:
+                    for fact_row in csv.DictReader(f):
+                        self.fact_rows += 1
+                        self.add_fact(fact_row)
+            except Exception as e:
+                print(f"  Error reading {fact_file}: {e}")
+
+        print(f"  ✓ Fact rows joined: {self.joined_rows} of {self.fact_rows}")
+
+    def add_fact(self, fact_row: Dict):
+        work_type = self.first_value(fact_row, self.fact_columns['work_type'])
+        task = self.first_value(fact_row, self.fact_columns['task'])
+        detail = self.first_value(fact_row, self.fact_columns['detail'])
+
+        # A fact row is booked once: by sprint task if possible, else by detail
+        key = ('task', task, work_type or None)
+        if not task or key not in self.aggregates:
+            key = ('detail', detail, work_type)
+            if not detail or key not in self.aggregates:
+                return
+
+        hours = self.first_value(fact_row, self.fact_columns['hours'])
+        try:
+            hours_float = float(hours.replace(',', '.')) if hours else 0
+        except ValueError:
+            hours_float = 0
+
+        start = self.parse_date(self.first_value(fact_row, self.fact_columns['start']))
+        end = self.parse_date(self.first_value(fact_row, self.fact_columns['end']))
+
+        aggregate = self.aggregates[key]
+        if aggregate is None:
+            aggregate = self.aggregates[key] = [0.0, None, None]
+
+        aggregate[0] += hours_float
+        if start and (aggregate[1] is None or start < aggregate[1]):
+            aggregate[1] = start
+        if end and (aggregate[2] is None or end > aggregate[2]):
+            aggregate[2] = end
+
+        self.joined_rows += 1
+
+    def apply(self, row: Dict) -> Dict:
+        """Fill actual dates, hours (this row's share) and variance of one activity row"""
+        plan_hours = self.plan_hours(row)
+        hours = 0.0
+        starts = []
+        ends = []
+        joined = False
+
+        for key in self.plan_keys(row):
+            aggregate = self.aggregates.get(key)
+            if not aggregate:
+                continue
+
+            key_plan_hours, key_rows = self.plan_totals[key]
+            share = plan_hours / key_plan_hours if key_plan_hours else 1 / key_rows
+
+            hours += aggregate[0] * share
+            if aggregate[1]:
+                starts.append(aggregate[1])
+            if aggregate[2]:
+                ends.append(aggregate[2])
+            joined = True
+
+        if not joined:
+            return row
+
+        columns = self.output_columns
+
+        row[columns['fact_hours']] = round(hours, 1)
+        row[columns['variance']] = round(hours - plan_hours, 1)
+        if starts:
+            row[columns['fact_start']] = min(starts).strftime('%d.%m.%Y')
+        if ends:
+            row[columns['fact_end']] = max(ends).strftime('%d.%m.%Y')
+
+        return row
+
+
+class PlanRollup:
+    """
+    Running plan totals per sprint, section (Розділ) and work type
+
+    Hours are summed as Decimal so partial rollups from shard workers merge
+    to exactly the same totals as a serial run.
+    """
+
+    def __init__(self, schema: Dict = DEFAULT_SCHEMA):
+        from decimal import Decimal
+
+        self.decimal = Decimal
+        self.groups = {}  # (dimension, value) → [plan hours, features, critical, activities]
+        self.importance_column = schema['gap_columns']['importance']
+        self.critical_importance = schema['critical_importance']
+        self.section_column = schema['output_columns']['section']
+        self.work_type_column = schema['output_columns']['work_type']
+        self.hours_column = schema['output_columns']['plan_hours']
+        self.dimensions = ['Sprint', self.section_column, self.work_type_column]
+
+    def group(self, dimension: str, value: str) -> List:
+        key = (dimension, value)
+        if key not in self.groups:
+            self.groups[key] = [self.decimal(0), 0, 0, 0]
+        return self.groups[key]
+
+    def add(self, gap_row: Dict, rows: List[Dict], sprint_num: str):
+        """Account one GAP feature and its output rows"""
+        critical = gap_row.get(self.importance_column, '').strip() == self.critical_importance
+        section = rows[0].get(self.section_column, '') if rows else ''
+        feature_groups = [('Sprint', sprint_num), (self.section_column, section)]
+
+        for row in rows:
+            work_type = row.get(self.work_type_column, '')
+            feature_groups.append((self.work_type_column, work_type))
+            hours = self.decimal(str(row.get(self.hours_column) or 0))
+
+            for dimension, value in (('Sprint', sprint_num), (self.section_column, row.get(self.section_column, '')),
+                                     (self.work_type_column, work_type)):
+                group = self.group(dimension, value)
+                group[0] += hours
+                group[3] += 1
+
+        for dimension, value in dict.fromkeys(feature_groups):
+            group = self.group(dimension, value)
+            group[1] += 1
+            group[2] += critical
+
+    def state(self) -> List[List]:
+        """JSON-serializable totals (hours as exact decimal strings)"""
+        return [[dimension, value, str(totals[0])] + totals[1:]
+                for (dimension, value), totals in self.groups.items()]
+
+    def load_state(self, state: List[List]):
+        self.groups = {(dimension, value): [self.decimal(hours)] + counts
+                       for dimension, value, hours, *counts in state}
+
+    def merge(self, other: 'PlanRollup'):
+        for (dimension, value), totals in other.groups.items():
+            group = self.group(dimension, value)
+            for i, total in enumerate(totals):
+                group[i] += total
+
+    def summary_rows(self, sprint_map: Dict) -> List[Dict]:
+        """One row per group with capacity utilisation for sprints"""
+        capacity = {}
+        for sprint_info in sprint_map.values():
+            try:
+                hours = self.decimal(sprint_info['hours'].replace(',', '.')) if sprint_info['hours'] else 0
+            except ArithmeticError:
+                hours = 0
+            capacity[sprint_info['sprint_num']] = capacity.get(sprint_info['sprint_num'], 0) + hours
+
+        def order(key):
+            dimension, value = key
+            if dimension == 'Sprint':
+                return self.dimensions.index(dimension), not value.isdigit(), int(value) if value.isdigit() else 0, value
+            return self.dimensions.index(dimension), False, 0, value
+
+        rows = []
+        for key in sorted(self.groups, key=order):
+            dimension, value = key
+            hours, features, critical, activities = self.groups[key]
+            sprint_capacity = capacity.get(value) if dimension == 'Sprint' else None
+
+            rows.append({
+                'Dimension': dimension,
+                'Value': value,
+                'Plan Hours': f'{hours:.1f}',
+                'Features': features,
+                'Critical': critical,
+                'Activities': activities,
+                'Capacity (год)': f'{sprint_capacity:.1f}' if sprint_capacity is not None else '',
+                'Utilisation': f'{hours / sprint_capacity:.0%}' if sprint_capacity else ''
+            })
+
+        return rows
+
+
+class PlanDiff:
+    """
+    Streaming diff of two generated plan files
+
+    Rows are keyed by (Розділ, Деталізація, Тип робіт) plus an occurrence
+    number for repeated keys. Only the previous plan is indexed, as a key
+    digest → (per-column value digests, sprint) map, so memory grows with
+    the number of previous rows but not with their width:
+    - pass 1 indexes the previous plan
+    - pass 2 streams the current plan and writes added and changed rows
+    - pass 3 streams the previous plan again and writes removed rows
+    """
+
+    COLUMN_DIGEST_SIZE = 4
+
+    def __init__(self, schema: Dict = DEFAULT_SCHEMA):
+        from hashlib import blake2b
+
+        self.blake2b = blake2b
+        columns = schema['output_columns']
+        self.key_columns = [columns['section'], columns['detail'], columns['work_type']]
+        self.date_columns = [columns['plan_start'], columns['plan_end']]
+        self.comments_column = columns['comments']
+
+        # "Planned in Sprint {sprint}" → r"Planned in Sprint (.+)"
+        self.sprint_comment = re.compile(
+            re.escape(schema['planned_comment']).replace(re.escape('{sprint}'), '(.+)') + '$')
+
+        self.entries = {}  # key digest → (column digests, sprint), None once matched
+        self.value_columns = []
+        self.sprints = {}  # sprint → change counts
+        self.counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+
+    def sprint_label(self, row: Dict) -> str:
+        match = self.sprint_comment.match(row.get(self.comments_column) or '')
+        return sys.intern(match.group(1)) if match else 'Backlog'
+
+    def key_digest(self, key: List[str], occurrence: int) -> bytes:
+        text = '\x1f'.join(key + [str(occurrence)])
+        return self.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def column_digests(self, row: Dict) -> bytes:
+        """32-bit hash per value column, packed into one bytes object"""
+        # hash() is salted per process; both plans are hashed by this one
+        return array.array('I', [hash(row.get(column) or '') & 0xFFFFFFFF
+                                 for column in self.value_columns]).tobytes()
+
+    def changed_columns(self, old_digests: bytes, new_digests: bytes) -> List[str]:
+        size = self.COLUMN_DIGEST_SIZE
+        return [column for i, column in enumerate(self.value_columns)
+                if old_digests[i * size:(i + 1) * size] != new_digests[i * size:(i + 1) * size]]
+
+    def count(self, sprint: str, change: str):
+        if sprint not in self.sprints:
+            self.sprints[sprint] = dict.fromkeys(
+                ['Added', 'Removed', 'Changed', 'Re-dated', 'Moved In', 'Moved Out'], 0)
+        self.sprints[sprint][change] += 1
+
+    def index_previous(self, old_file: str):
+        """Pass 1: key digests of every row of the previous plan, in file order"""
+        with open(old_file, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            self.value_columns = [column for column in reader.fieldnames or [] if column not in self.key_columns]
+
+            for row in reader:
+                key = [row.get(column) or '' for column in self.key_columns]
+                occurrence = 0
+                key_digest = self.key_digest(key, occurrence)
+
+                while key_digest in self.entries:
+                    occurrence += 1
+                    key_digest = self.key_digest(key, occurrence)
+
+                self.entries[key_digest] = (self.column_digests(row), self.sprint_label(row))
+
+    def diff(self, old_file: str, new_file: str, output_file: str = 'Plan_Diff.csv'):
+        """Write added, changed and removed rows of new_file compared with old_file"""
+        print(f"\nDiffing {new_file} against {old_file}")
+
+        self.index_previous(old_file)
+        print(f"  Previous plan rows indexed: {len(self.entries)}")
+
+        with open(new_file, 'r', encoding='utf-8') as new_f, \
+                open(output_file, 'w', encoding='utf-8', newline='') as output_f:
+            reader = csv.DictReader(new_f)
+            fieldnames = list(reader.fieldnames or [])
+            fieldnames += [column for column in self.key_columns + self.value_columns if column not in fieldnames]
+
+            writer = csv.DictWriter(output_f, extrasaction='ignore', fieldnames=[
+                'Change', 'Sprint', 'Previous Sprint', 'Changed Columns'] + fieldnames)
+            writer.writeheader()
+
+            # Pass 2: current plan
+            for row in reader:
+                key = [row.get(column) or '' for column in self.key_columns]
+                sprint = self.sprint_label(row)
+                occurrence = 0
+                key_digest = self.key_digest(key, occurrence)
+
+                # Skip previous rows with the same key already matched
+                while key_digest in self.entries and self.entries[key_digest] is None:
+                    occurrence += 1
+                    key_digest = self.key_digest(key, occurrence)
+
+                previous = self.entries.get(key_digest)
+
+                if previous is None:
+                    self.counts['added'] += 1
+                    self.count(sprint, 'Added')
+                    writer.writerow(dict(row, **{'Change': 'added', 'Sprint': sprint}))
+                    continue
+
+                self.entries[key_digest] = None
+                old_digests, old_sprint = previous
+                changed = self.changed_columns(old_digests, self.column_digests(row))
+
+                if not changed:
+                    self.counts['unchanged'] += 1
+                    continue
+
+                self.counts['changed'] += 1
+                self.count(sprint, 'Changed')
+                if any(column in changed for column in self.date_columns):
+                    self.count(sprint, 'Re-dated')
+                if sprint != old_sprint:
+                    self.count(sprint, 'Moved In')
+                    self.count(old_sprint, 'Moved Out')
+
+                writer.writerow(dict(row, **{
+                    'Change': 'changed',
+                    'Sprint': sprint,
+                    'Previous Sprint': old_sprint if sprint != old_sprint else '',
+                    'Changed Columns': '; '.join(changed)
+                }))
+
+            # Pass 3: previous rows never matched were removed
+            with open(old_file, 'r', encoding='utf-8') as old_f:
+                for row, previous in zip(csv.DictReader(old_f), self.entries.values()):
+                    if previous is None:
+                        continue
+
+                    self.counts['removed'] += 1
+                    self.count(previous[1], 'Removed')
+                    writer.writerow(dict(row, **{'Change': 'removed', 'Sprint': previous[1]}))
+
+        print(f"  ✓ Added: {self.counts['added']}")
+        print(f"  ✓ Removed: {self.counts['removed']}")
+        print(f"  ✓ Changed: {self.counts['changed']}")
+        print(f"  ✓ Unchanged: {self.counts['unchanged']}")
+        print(f"  ✓ Successfully written {self.counts['added'] + self.counts['removed'] + self.counts['changed']} "
+              f"rows to {output_file}")
+
+    def summary_rows(self) -> List[Dict]:
+        """Change counts per sprint (numeric sprints first, Backlog last) and a total"""
+        def order(sprint):
+            return not sprint.isdigit(), int(sprint) if sprint.isdigit() else 0, sprint
+
+        rows = [dict(counts, Sprint=sprint) for sprint, counts in sorted(self.sprints.items(), key=lambda i: order(i[0]))]
+
+        total = {'Sprint': 'Total'}
+        for row in rows:
+            for change, value in row.items():
+                if change != 'Sprint':
+                    total[change] = total.get(change, 0) + value
+
+        return rows + [total] if rows else rows
+
+    def write_summary(self, summary_file: str = 'Plan_Diff_Summary.csv'):
+        """Write the per-sprint change summary"""
+        print(f"\nWriting diff summary to: {summary_file}")
+
+        rows = self.summary_rows()
+
+        try:
+            with open(summary_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['Sprint', 'Added', 'Removed', 'Changed', 'Re-dated',
+                                                       'Moved In', 'Moved Out'])
+                writer.writeheader()
+                writer.writerows(rows)
+
+            print(f"  ✓ Successfully written {len(rows)} sprints")
+        except Exception as e:
+            print(f"  ✗ Error writing summary: {e}")
+
 
 class ProjectPlanConsolidator:
-    def __init__(self):
+    def __init__(self, schema: Optional[Dict] = None):
+        from difflib import SequenceMatcher
+
+        self.sequence_matcher = SequenceMatcher
+        self.schema = schema or DEFAULT_SCHEMA
+        self.gap_columns = self.schema['gap_columns']
+        self.sprint_columns = self.schema['sprint_columns']
+        self.output_columns = self.schema['output_columns']
+        self.stem_keywords = self.schema.get('stem_keywords', True)
         self.sprint_map = {}
         self.gap_data = []
         self.output_rows = []
         self.match_report = []
-
-    def fuzzy_match_score(self, str1: str, str2: str) -> float:
+        self.fact_join = None
+        self.rollup = PlanRollup(self.schema)
+        self.sprint_tasks = []  # sprint task names in catalogue order
+        self.lsh = None
+        self.trigram_index = None
+        self.trigram_candidates = 0
+        # Match cascade (see build_match_cascade)
+        self.task_texts = []
+        self.task_keywords = []
+        self.exact_index = None
+        self.exact_unrivalled = set()
+        self.containment_index = None
+        self.reverse_containment = {}
+
+    def extract_keywords(self, text: str) -> set:
+        """Extract keywords (remove common words, reduce to stems)"""
+        words = re.findall(r'\w+', text.lower())
+        keywords = [w for w in words if len(w) > 3 and w not in STOP_WORDS]
+
+        if self.stem_keywords:
+            return set(stem_word(w) for w in keywords)
+        return set(keywords)
+
+    def fuzzy_match_score(self, str1: str, str2: str, fallback: bool = True) -> float:
         """Enhanced fuzzy matching with keyword detection"""
         s1 = str1.lower().strip()
         s2 = str2.lower().strip()
@@ -33,16 +701,8 @@ class ProjectPlanConsolidator:
         if s1 in s2 or s2 in s1:
             return 0.95
 
-        # Extract keywords (remove common words)
-        stop_words = {'та', 'і', 'в', 'на', 'з', 'по', 'для', 'що', 'який', 'яка', 'яке',
-                      'від', 'до', 'за', 'про', 'при', 'під', 'над', 'через', 'у'}
-
-        def extract_keywords(text):
-            words = re.findall(r'\w+', text.lower())
-            return set(w for w in words if len(w) > 3 and w not in stop_words)
-
-        keywords1 = extract_keywords(s1)
-        keywords2 = extract_keywords(s2)
+        keywords1 = self.extract_keywords(s1)
+        keywords2 = self.extract_keywords(s2)
 
         if keywords1 and keywords2:
             # Jaccard similarity for keywords
@@ -55,25 +715,295 @@ class ProjectPlanConsolidator:
                 return 0.7 + (keyword_score * 0.3)
 
         # Sequence matcher as fallback
-        return SequenceMatcher(None, s1, s2).ratio()
+        if not fallback:
+            return 0.0
+
+        return self.sequence_matcher(None, s1, s2).ratio()
 
-    def find_best_match(self, task_name: str, threshold: float = 0.5) -> Optional[Tuple[str, Dict, float]]:
+    def find_best_match(self, task_name: str, threshold: float = MATCH_THRESHOLD) -> Optional[Tuple[str, Dict, float]]:
         """Find best matching sprint task with score"""
-        best_match = None
-        best_sprint_task = None
-        best_score = threshold
-
-        for sprint_task, sprint_info in self.sprint_map.items():
-            score = self.fuzzy_match_score(task_name, sprint_task)
-            if score > best_score:
-                best_score = score
-                best_match = sprint_info
-                best_sprint_task = sprint_task
-
-        if best_match:
-            return best_sprint_task, best_match, best_score
+        matches = self.top_matches(task_name, 1, threshold)
+
+        if matches:
+            best_sprint_task, best_score = matches[0]
+            return best_sprint_task, self.sprint_map[best_sprint_task], best_score
         return None
 
+    def top_matches(self, task_name: str, k: int = 1,
+                    threshold: float = MATCH_THRESHOLD) -> List[Tuple[str, float]]:
+        """
+        Top k sprint tasks scoring above threshold, best first
+
+        Ties are ordered by catalogue position, so the first entry is the
+        task a sequential scan with `score > best_score` would pick.
+        """
+        if self.exact_index is not None:
+            return self.top_matches_cascade(task_name, k, threshold)
+
+        scored = []
+        fallback_tasks = self.fallback_candidates(task_name)
+
+        for position, sprint_task in enumerate(self.candidate_tasks(task_name)):
+            fallback = fallback_tasks is None or sprint_task in fallback_tasks
+            score = self.fuzzy_match_score(task_name, sprint_task, fallback)
+            if score > threshold:
+                scored.append((-score, position, sprint_task))
+
+        return [(sprint_task, -neg_score) for neg_score, _, sprint_task in heapq.nsmallest(k, scored)]
+
+    def build_match_cascade(self):
+        """
+        Prepare the staged matcher used by find_best_match
+
+        Stage 1: hash lookup of the normalized requirement (score 1.0); for
+                 k=1 the search stops here unless an earlier task with the
+                 same keyword set could tie at 1.0
+        Stage 2: Aho-Corasick automaton over all task texts finds every task
+                 contained in the requirement (score 0.95); tasks containing
+                 the requirement come from index_reverse_containment
+        Stage 3: keyword Jaccard and SequenceMatcher for the remaining tasks,
+                 skipped whenever an upper bound shows they cannot win
+
+        The result is identical to scoring every task with fuzzy_match_score.
+        """
+        from match_index import AhoCorasick
+
+        self.sprint_tasks = list(self.sprint_map)
+        self.task_texts = [task.lower().strip() for task in self.sprint_tasks]
+        self.task_keywords = [self.extract_keywords(text) for text in self.task_texts]
+        self.exact_index = {}
+        self.containment_index = AhoCorasick()
+        self.reverse_containment = {}
+
+        for task_id, text in enumerate(self.task_texts):
+            self.exact_index.setdefault(text, task_id)
+            self.containment_index.add(text, task_id)
+
+        self.containment_index.build()
+
+        # Only a keyword Jaccard of 1.0 (0.7 + 0.3) from an earlier task that
+        # is not a substring either way can tie an exact hit and win on id
+        keyword_groups = {}
+        for task_id, keywords in enumerate(self.task_keywords):
+            if keywords:
+                keyword_groups.setdefault(frozenset(keywords), []).append(task_id)
+
+        self.exact_unrivalled = set()
+        for text, task_id in self.exact_index.items():
+            rivals = keyword_groups.get(frozenset(self.task_keywords[task_id]), [])
+            if not any(other < task_id and text not in self.task_texts[other] and self.task_texts[other] not in text
+                       for other in rivals):
+                self.exact_unrivalled.add(task_id)
+
+    def index_reverse_containment(self, features: List[str]):
+        """
+        Find the tasks containing each requirement in one pass over the catalogue
+
+        An automaton over the requirement texts is run once over every task
+        text; requirements missing from this map are checked pairwise.
+        """
+        from match_index import AhoCorasick
+
+        queries = sorted({feature.lower().strip() for feature in features} - {''})
+        automaton = AhoCorasick()
+
+        for query_id, query in enumerate(queries):
+            automaton.add(query, query_id)
+
+        self.reverse_containment = {query: set() for query in queries}
+
+        for task_id, text in enumerate(self.task_texts):
+            for query_id in automaton.find_all(text):
+                self.reverse_containment[queries[query_id]].add(task_id)
+
+    def top_matches_cascade(self, task_name: str, k: int = 1,
+                            threshold: float = MATCH_THRESHOLD) -> List[Tuple[str, float]]:
+        """Staged version of top_matches (see build_match_cascade)"""
+        s1 = task_name.lower().strip()
+
+        # (score, task_id) best first; lowest task id wins ties
+        top = []
+
+        def beats(score, task_id):
+            bar_score, bar_id = top[-1] if len(top) >= k else (threshold, -1)
+            return score > bar_score or (score == bar_score and task_id < bar_id)
+
+        def admit(score, task_id):
+            top.append((score, task_id))
+            top.sort(key=lambda entry: (-entry[0], entry[1]))
+            del top[k:]
+
+        # Stage 1: exact normalized equality
+        exact_id = self.exact_index.get(s1)
+        if exact_id is not None and beats(1.0, exact_id):
+            admit(1.0, exact_id)
+            if k == 1 and exact_id in self.exact_unrivalled:
+                return [(self.sprint_tasks[exact_id], 1.0)]
+
+        # Stage 2: containment in either direction
+        contained = self.containment_index.find_all(s1)
+        if s1 in self.reverse_containment:
+            contained |= self.reverse_containment[s1]
+        else:
+            contained |= {task_id for task_id, text in enumerate(self.task_texts) if s1 in text}
+
+        for task_id in sorted(contained):
+            score = 1.0 if self.task_texts[task_id] == s1 else 0.95
+            if task_id != exact_id and beats(score, task_id):
+                admit(score, task_id)
+
+        # Stage 3: keywords and sequence matching for the remaining tasks
+        keywords1 = self.extract_keywords(s1)
+        fallback_tasks = self.fallback_candidates(task_name)
+        len1 = len(s1)
+
+        for task_id in self.candidate_ids(task_name):
+            if task_id in contained or not beats(1.0, task_id):
+                continue
+
+            keywords2 = self.task_keywords[task_id]
+
+            if keywords1 and keywords2:
+                keyword_score = len(keywords1 & keywords2) / len(keywords1 | keywords2)
+
+                if keyword_score > 0.4:
+                    score = 0.7 + (keyword_score * 0.3)
+                    if beats(score, task_id):
+                        admit(score, task_id)
+                    continue
+
+            sprint_task = self.sprint_tasks[task_id]
+            if fallback_tasks is not None and sprint_task not in fallback_tasks:
+                score = 0.0
+            else:
+                # ratio() <= 2 * min(len) / (len1 + len2), then quick_ratio() bound
+                s2 = self.task_texts[task_id]
+                len2 = len(s2)
+                if not beats(2.0 * min(len1, len2) / (len1 + len2), task_id):
+                    continue
+
+                matcher = self.sequence_matcher(None, s1, s2)
+                if not beats(matcher.quick_ratio(), task_id):
+                    continue
+                score = matcher.ratio()
+
+            if beats(score, task_id):
+                admit(score, task_id)
+
+        return [(self.sprint_tasks[task_id], score) for score, task_id in top]
+
+    def build_lsh_index(self, bands: int = 32, rows: int = 2):
+        """
+        Index sprint task keyword sets with MinHash/LSH
+
+        Once built, find_best_match only rescores the tasks whose keyword
+        sets collide with the requirement in at least one LSH band.
+        """
+        from match_index import MinHashLSH
+
+        self.sprint_tasks = list(self.sprint_map)
+        self.lsh = MinHashLSH(bands, rows)
+
+        for task_id, sprint_task in enumerate(self.sprint_tasks):
+            self.lsh.add(task_id, self.extract_keywords(sprint_task))
+
+        print(f"  LSH index: {bands} bands x {rows} rows over {len(self.sprint_tasks)} tasks")
+
+    def build_trigram_index(self, candidates: int = 20):
+        """
+        Index normalized sprint task texts by character trigrams
+
+        Once built, the SequenceMatcher fallback only runs against the
+        `candidates` tasks sharing the most trigrams with the requirement.
+        """
+        from match_index import TrigramIndex
+
+        self.sprint_tasks = list(self.sprint_map)
+        self.trigram_index = TrigramIndex()
+        self.trigram_candidates = candidates
+
+        for task_id, sprint_task in enumerate(self.sprint_tasks):
+            self.trigram_index.add(task_id, sprint_task.lower().strip())
+
+        print(f"  Trigram index: {len(self.trigram_index.postings)} trigrams, "
+              f"top {candidates} fallback candidates")
+
+    def fallback_candidates(self, task_name: str) -> Optional[set]:
+        """Sprint tasks allowed to reach the SequenceMatcher fallback (None = all)"""
+        if self.trigram_index is None:
+            return None
+
+        task_ids = self.trigram_index.query(task_name.lower().strip(), self.trigram_candidates)
+        return {self.sprint_tasks[task_id] for task_id in task_ids}
+
+    def candidate_ids(self, task_name: str) -> List[int]:
+        """Positions in sprint_tasks worth scoring for a GAP feature, in catalogue order"""
+        keywords = self.extract_keywords(task_name) if self.lsh is not None else None
+
+        # Without keywords LSH cannot retrieve anything: score the whole catalogue
+        if not keywords:
+            return list(range(len(self.sprint_tasks)))
+
+        return sorted(self.lsh.query(keywords))
+
+    def candidate_tasks(self, task_name: str) -> List[str]:
+        """Sprint tasks worth scoring for a GAP feature, in catalogue order"""
+        if self.lsh is None:
+            return list(self.sprint_map)
+
+        return [self.sprint_tasks[task_id] for task_id in self.candidate_ids(task_name)]
+
+    def matching_state(self) -> Dict:
+        """Everything a worker process needs to match GAP rows"""
+        return {
+            'sprint_map': self.sprint_map,
+            'sprint_tasks': self.sprint_tasks,
+            'lsh': self.lsh,
+            'trigram_index': self.trigram_index,
+            'trigram_candidates': self.trigram_candidates,
+            'task_texts': self.task_texts,
+            'task_keywords': self.task_keywords,
+            'exact_index': self.exact_index,
+            'exact_unrivalled': self.exact_unrivalled,
+            'containment_index': self.containment_index,
+            'stem_keywords': self.stem_keywords,
+        }
+
+    def load_index(self, index_file: str):
+        """
+        Restore the sprint map and match indexes saved by `compile-index`
+
+        Index files are pickles: only load files you created yourself.
+        """
+        import pickle
+
+        print(f"Loading match index: {index_file}")
+
+        stem_keywords = self.stem_keywords
+
+        with open(index_file, 'rb') as f:
+            self.__dict__.update(pickle.load(f))
+
+        # Task keyword sets in the index were built with its own setting
+        if self.stem_keywords != stem_keywords:
+            print(f"  ! Index compiled {'with' if self.stem_keywords else 'without'} stemming; using that")
+
+        print(f"  Total tasks mapped: {len(self.sprint_map)}")
+
+    def save_index(self, index_file: str):
+        """Save the sprint map and match indexes for fast `match` runs"""
+        import pickle
+
+        print(f"\nWriting match index to: {index_file}")
+
+        try:
+            with open(index_file, 'wb') as f:
+                pickle.dump(self.matching_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            print(f"  ✓ Successfully written {len(self.sprint_map)} tasks")
+        except Exception as e:
+            print(f"  ✗ Error writing index: {e}")
+
     def parse_date(self, date_str: str) -> Optional[datetime]:
         """Parse date from various formats"""
         if not date_str or date_str.strip() == '':
@@ -109,16 +1039,17 @@ class ProjectPlanConsolidator:
 
         return activity_start, activity_end
 
-    def read_sprint_files(self, sprint_pattern: str = "*Спринт*.csv"):
+    def read_sprint_files(self, sprint_pattern: Optional[str] = None):
         """Read all sprint files"""
         print("Reading sprint files...")
 
-        sprint_files = sorted(glob.glob(sprint_pattern))
+        columns = self.sprint_columns
+        sprint_files = sorted(glob.glob(sprint_pattern or self.schema['sprint_pattern']))
 
         for sprint_file in sprint_files:
             print(f"  Processing: {sprint_file}")
 
-            sprint_num_match = re.search(r'(\d+)\s+Спринт', sprint_file)
+            sprint_num_match = re.search(self.schema['sprint_number_pattern'], sprint_file)
             sprint_num = sprint_num_match.group(1) if sprint_num_match else "Unknown"
 
             try:
@@ -130,9 +1061,9 @@ class ProjectPlanConsolidator:
                     sprint_end = None
 
                     for row in rows:
-                        if 'Дата початку спринта' in row and 'Дата завершення спринта' in row:
-                            start_str = row['Дата початку спринта']
-                            end_str = row['Дата завершення спринта']
+                        if columns['start'] in row and columns['end'] in row:
+                            start_str = row[columns['start']]
+                            end_str = row[columns['end']]
 
                             if start_str and end_str:
                                 sprint_start = self.parse_date(start_str)
@@ -142,14 +1073,15 @@ class ProjectPlanConsolidator:
                                     break
 
                     for row in rows:
-                        task_name = row.get('Задача', '').strip()
-                        if task_name and task_name != 'Задача' and not task_name.startswith('Всього'):
+                        task_name = row.get(columns['task'], '').strip()
+                        if (task_name and task_name != columns['task']
+                                and not task_name.startswith(columns['total_prefix'])):
                             self.sprint_map[task_name] = {
                                 'sprint_num': sprint_num,
                                 'start_date': sprint_start,
                                 'end_date': sprint_end,
-                                'hours': row.get('Оцінка (год)', ''),
-                                'group': row.get('Група', '')
+                                'hours': row.get(columns['hours'], ''),
+                                'group': row.get(columns['group'], '')
                             }
 
             except Exception as e:
@@ -169,29 +1101,37 @@ class ProjectPlanConsolidator:
         except Exception as e:
             print(f"  Error reading GAP file: {e}")
 
-    def explode_activities(self, gap_row: Dict, sprint_info: Dict) -> List[Dict]:
-        """Create multiple activity rows based on coverage type"""
-        activities = []
+    @staticmethod
+    def parse_hours(hours: str) -> float:
+        """Parse an hours estimate ("1,5" → 1.5); empty or invalid → 0"""
+        try:
+            return float(hours.replace(',', '.')) if hours else 0
+        except:
+            return 0
 
-        coverage = gap_row.get('Покриття вимоги', '').strip()
-        feature_name = gap_row.get('Вимога', '').strip()
-        section = gap_row.get('Функціонал /Блок', '').strip()
-        importance = gap_row.get('Важливість', '').strip()
+    def gap_hours(self, gap_row: Dict) -> float:
+        """BA plus developer estimate of a GAP row"""
+        return (self.parse_hours(gap_row.get(self.gap_columns['ba_hours'], '0')) +
+                self.parse_hours(gap_row.get(self.gap_columns['dev_hours'], '0')))
 
-        ba_hours = gap_row.get('Оцінка БА (год)', '0')
-        dev_hours = gap_row.get('Оцінка Розробників (год)', '0')
+    def coverage_template(self, coverage: str) -> List[Dict]:
+        """Activities of the first coverage template matching a coverage type"""
+        for template in self.schema['coverage_templates']:
+            if template['coverage'] == '*' or coverage in template['coverage']:
+                return template['activities']
+        return []
 
-        try:
-            ba_hours_float = float(ba_hours.replace(',', '.')) if ba_hours else 0
-        except:
-            ba_hours_float = 0
+    def explode_activities(self, gap_row: Dict, sprint_info: Dict) -> List[Dict]:
+        """Create multiple activity rows based on coverage type"""
+        activities = []
+        columns = self.output_columns
 
-        try:
-            dev_hours_float = float(dev_hours.replace(',', '.')) if dev_hours else 0
-        except:
-            dev_hours_float = 0
+        coverage = gap_row.get(self.gap_columns['coverage'], '').strip()
+        feature_name = gap_row.get(self.gap_columns['feature'], '').strip()
+        section = gap_row.get(self.gap_columns['section'], '').strip()
+        importance = gap_row.get(self.gap_columns['importance'], '').strip()
 
-        total_hours = ba_hours_float + dev_hours_float
+        total_hours = self.gap_hours(gap_row)
 
         start_date = sprint_info['start_date']
         end_date = sprint_info['end_date']
@@ -199,156 +1139,71 @@ class ProjectPlanConsolidator:
 
         # Determine status based on importance
         status = ''
-        if importance == 'Критично':
-            status = 'Заплановано'
-
-        if not start_date or not end_date:
-            # No dates available
-            if coverage in ['Розробка', 'Кастомізація']:
-                activities = [
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Моделювання',
-                        'Статус': status,
-                        'Облік часу (план)': round(total_hours * 0.1, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Розробка',
-                        'Статус': status,
-                        'Облік часу (план)': round(total_hours * 0.6, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Налаштування',
-                        'Статус': status,
-                        'Облік часу (план)': round(total_hours * 0.2, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Навчання',
-                        'Статус': status,
-                        'Облік часу (план)': round(total_hours * 0.1, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    }
-                ]
-            else:
-                activities = [
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Налаштування',
-                        'Статус': status,
-                        'Облік часу (план)': round(total_hours * 0.8, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Навчання',
-                        'Статус': status,
-                        'Облік часу (план)': round(total_hours * 0.2, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    }
-                ]
-        else:
-            # Calculate dates
-            if coverage in ['Розробка', 'Кастомізація']:
-                modeling_start, modeling_end = self.calculate_activity_dates(
-                    start_date, end_date, 0.1, 0
-                )
-                dev_start, dev_end = self.calculate_activity_dates(
-                    start_date, end_date, 0.6, 0.1
-                )
-                config_start, config_end = self.calculate_activity_dates(
-                    start_date, end_date, 0.2, 0.7
-                )
-                training_start, training_end = self.calculate_activity_dates(
-                    start_date, end_date, 0.1, 0.9
-                )
-
-                activities = [
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Моделювання',
-                        'Статус': status,
-                        'Дата початку план': modeling_start.strftime('%d.%m.%Y'),
-                        'Дата закінчення план': modeling_end.strftime('%d.%m.%Y'),
-                        'Облік часу (план)': round(total_hours * 0.1, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Розробка',
-                        'Статус': status,
-                        'Дата початку план': dev_start.strftime('%d.%m.%Y'),
-                        'Дата закінчення план': dev_end.strftime('%d.%m.%Y'),
-                        'Облік часу (план)': round(total_hours * 0.6, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Налаштування',
-                        'Статус': status,
-                        'Дата початку план': config_start.strftime('%d.%m.%Y'),
-                        'Дата закінчення план': config_end.strftime('%d.%m.%Y'),
-                        'Облік часу (план)': round(total_hours * 0.2, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Навчання',
-                        'Статус': status,
-                        'Дата початку план': training_start.strftime('%d.%m.%Y'),
-                        'Дата закінчення план': training_end.strftime('%d.%m.%Y'),
-                        'Облік часу (план)': round(total_hours * 0.1, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    }
-                ]
-            else:
-                config_start, config_end = self.calculate_activity_dates(
-                    start_date, end_date, 0.8, 0
-                )
-                training_start, training_end = self.calculate_activity_dates(
-                    start_date, end_date, 0.2, 0.8
+        if importance == self.schema['critical_importance']:
+            status = self.schema['critical_status']
+
+        for template in self.coverage_template(coverage):
+            activity = {
+                columns['section']: section,
+                columns['detail']: feature_name,
+                columns['work_type']: template['work_type'],
+                columns['status']: status,
+                columns['plan_hours']: round(total_hours * template['share'], 1),
+                columns['comments']: self.schema['planned_comment'].format(sprint=sprint_num)
+            }
+
+            # Dates only when the sprint has them
+            if start_date and end_date:
+                activity_start, activity_end = self.calculate_activity_dates(
+                    start_date, end_date, template['share'], template['offset']
                 )
+                activity[columns['plan_start']] = activity_start.strftime('%d.%m.%Y')
+                activity[columns['plan_end']] = activity_end.strftime('%d.%m.%Y')
 
-                activities = [
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Налаштування',
-                        'Статус': status,
-                        'Дата початку план': config_start.strftime('%d.%m.%Y'),
-                        'Дата закінчення план': config_end.strftime('%d.%m.%Y'),
-                        'Облік часу (план)': round(total_hours * 0.8, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    },
-                    {
-                        'Розділ': section,
-                        'Деталізація': feature_name,
-                        'Тип робіт': 'Навчання',
-                        'Статус': status,
-                        'Дата початку план': training_start.strftime('%d.%m.%Y'),
-                        'Дата закінчення план': training_end.strftime('%d.%m.%Y'),
-                        'Облік часу (план)': round(total_hours * 0.2, 1),
-                        'Коментарі': f'Planned in Sprint {sprint_num}'
-                    }
-                ]
+            activities.append(activity)
 
         return activities
 
+    def process_gap_row(self, gap_row: Dict) -> Optional[Tuple[List[Dict], Optional[Dict]]]:
+        """Match one GAP row and return its output rows and match report entry"""
+        feature = gap_row.get(self.gap_columns['feature'], '').strip()
+
+        if not feature:
+            return None
+
+        # Try to find matching sprint task
+        match_result = self.find_best_match(feature, self.schema['match_threshold'])
+
+        if match_result:
+            sprint_task, sprint_info, score = match_result
+
+            report_entry = {
+                'GAP Feature': feature,
+                'Sprint Task': sprint_task,
+                'Match Score': f'{score:.2f}',
+                'Sprint': sprint_info['sprint_num']
+            }
+
+            # Explode activities
+            activities = self.explode_activities(gap_row, sprint_info)
+            for activity in activities:
+                activity[SPRINT_TASK_COLUMN] = sprint_task
+
+            return activities, report_entry
+
+        # No match - add to backlog
+        columns = self.output_columns
+        section = gap_row.get(self.gap_columns['section'], '').strip()
+
+        backlog_row = {
+            columns['section']: section,
+            columns['detail']: feature,
+            columns['work_type']: self.schema['backlog_work_type'],
+            columns['plan_hours']: self.gap_hours(gap_row),
+            columns['comments']: self.schema['backlog_comment']
+        }
+        return [backlog_row], None
+
     def consolidate(self):
         """Main consolidation logic"""
         print("\nConsolidating GAP Analysis with Sprint Plans...")
@@ -356,81 +1211,450 @@ class ProjectPlanConsolidator:
         matched_count = 0
         unmatched_count = 0
 
+        if self.exact_index is not None:
+            self.index_reverse_containment([row.get(self.gap_columns['feature'], '') for row in self.gap_data])
+
         for gap_row in self.gap_data:
-            feature = gap_row.get('Вимога', '').strip()
+            result = self.process_gap_row(gap_row)
 
-            if not feature:
+            if result is None:
                 continue
 
-            # Try to find matching sprint task
-            match_result = self.find_best_match(feature)
-
-            if match_result:
-                sprint_task, sprint_info, score = match_result
+            rows, report_entry = result
+            self.output_rows.extend(rows)
+            self.rollup.add(gap_row, rows, report_entry['Sprint'] if report_entry else 'Backlog')
 
-                # Record match
-                self.match_report.append({
-                    'GAP Feature': feature,
-                    'Sprint Task': sprint_task,
-                    'Match Score': f'{score:.2f}',
-                    'Sprint': sprint_info['sprint_num']
-                })
-
-                # Explode activities
-                activities = self.explode_activities(gap_row, sprint_info)
-                self.output_rows.extend(activities)
+            if report_entry:
+                self.match_report.append(report_entry)
                 matched_count += 1
             else:
-                # No match - add to backlog
-                section = gap_row.get('Функціонал /Блок', '').strip()
-                ba_hours = gap_row.get('Оцінка БА (год)', '0')
-                dev_hours = gap_row.get('Оцінка Розробників (год)', '0')
-
-                try:
-                    ba_hours_float = float(ba_hours.replace(',', '.')) if ba_hours else 0
-                except:
-                    ba_hours_float = 0
-
-                try:
-                    dev_hours_float = float(dev_hours.replace(',', '.')) if dev_hours else 0
-                except:
-                    dev_hours_float = 0
-
-                total_hours = ba_hours_float + dev_hours_float
-
-                self.output_rows.append({
-                    'Розділ': section,
-                    'Деталізація': feature,
-                    'Тип робіт': 'Backlog',
-                    'Облік часу (план)': total_hours,
-                    'Коментарі': 'Not assigned to any sprint - BACKLOG'
-                })
                 unmatched_count += 1
 
         print(f"  ✓ Matched: {matched_count}")
         print(f"  ✓ Unmatched (Backlog): {unmatched_count}")
         print(f"  ✓ Total output rows: {len(self.output_rows)}")
 
+    def split_gap_file(self, gap_file: str, shard_dir: str, shard_by: str = 'section',
+                       shard_size: int = 5000, max_shards: int = 64) -> List[str]:
+        """
+        Stream the GAP file into shard files
+
+        shard_by:
+        - "section" → rows of one (scope, section) GAP column pair stay in one shard
+        - "rows"    → fixed ranges of shard_size rows
+
+        Every shard row keeps its original position in the ROW_COLUMN column.
+        """
+        shard_paths = []
+        writers = {}
+        handles = []
+        section_shards = {}
+
+        try:
+            with open(gap_file, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                fieldnames = [ROW_COLUMN] + list(reader.fieldnames or [])
+
+                for row_num, gap_row in enumerate(reader):
+                    if shard_by == 'rows':
+                        shard_id = row_num // shard_size
+                    else:
+                        section = (gap_row.get(self.gap_columns['scope'], ''),
+                                   gap_row.get(self.gap_columns['section'], ''))
+                        if section not in section_shards:
+                            section_shards[section] = len(section_shards) % max_shards
+                        shard_id = section_shards[section]
+
+                    writer = writers.get(shard_id)
+                    if writer is None:
+                        # Row-range shards are consecutive, so earlier ones can be closed
+                        if shard_by == 'rows' and handles:
+                            handles[-1].close()
+                        path = os.path.join(shard_dir, f'shard_{shard_id:05d}.csv')
+                        handle = open(path, 'w', encoding='utf-8', newline='')
+                        handles.append(handle)
+                        writer = csv.DictWriter(handle, fieldnames=fieldnames)
+                        writer.writeheader()
+                        writers[shard_id] = writer
+                        shard_paths.append(path)
+
+                    gap_row[ROW_COLUMN] = row_num
+                    writer.writerow(gap_row)
+        finally:
+            for handle in handles:
+                handle.close()
+
+        return shard_paths
+
+    def consolidate_shard(self, shard_path: str, part_dir: str) -> Tuple[str, str, int, int, PlanRollup]:
+        """Process one shard file and write its output and match report part files"""
+        name = os.path.splitext(os.path.basename(shard_path))[0]
+        output_part = os.path.join(part_dir, f'{name}.plan.csv')
+        report_part = os.path.join(part_dir, f'{name}.report.csv')
+
+        matched_count = 0
+        unmatched_count = 0
+
+        with open(shard_path, 'r', encoding='utf-8') as shard_f, \
+                open(output_part, 'w', encoding='utf-8', newline='') as output_f, \
+                open(report_part, 'w', encoding='utf-8', newline='') as report_f:
+            output_writer = csv.DictWriter(output_f, fieldnames=self.part_fieldnames())
+            report_writer = csv.DictWriter(report_f, fieldnames=[ROW_COLUMN] + MATCH_REPORT_FIELDNAMES)
+            output_writer.writeheader()
+            report_writer.writeheader()
+
+            gap_rows = list(csv.DictReader(shard_f))
+
+            if self.exact_index is not None:
+                self.index_reverse_containment([row.get(self.gap_columns['feature'], '') for row in gap_rows])
+
+            for gap_row in gap_rows:
+                result = self.process_gap_row(gap_row)
+
+                if result is None:
+                    continue
+
+                rows, report_entry = result
+                self.rollup.add(gap_row, rows, report_entry['Sprint'] if report_entry else 'Backlog')
+                self.write_part_rows(output_writer, report_writer, gap_row[ROW_COLUMN], rows, report_entry)
+
+                if report_entry:
+                    matched_count += 1
+                else:
+                    unmatched_count += 1
+
+        return output_part, report_part, matched_count, unmatched_count, self.rollup
+
+    def part_fieldnames(self) -> List[str]:
+        """Output columns of plan part files"""
+        return [ROW_COLUMN, SPRINT_TASK_COLUMN] + self.schema['output_fieldnames']
+
+    def write_part_rows(self, output_writer: csv.DictWriter, report_writer: csv.DictWriter,
+                        row_num: int, rows: List[Dict], report_entry: Optional[Dict]):
+        """Write the output rows and match report entry of one GAP row to part files"""
+        for row in rows:
+            output_row = {field: row.get(field, '') for field in self.schema['output_fieldnames']}
+            output_row[ROW_COLUMN] = row_num
+            output_row[SPRINT_TASK_COLUMN] = row.get(SPRINT_TASK_COLUMN, '')
+            output_writer.writerow(output_row)
+
+        if report_entry:
+            report_writer.writerow(dict(report_entry, **{ROW_COLUMN: row_num}))
+
+    def write_parts(self, output_parts: List[str], report_parts: List[str],
+                    output_file: str, report_file: str, fact_files: Optional[List[str]] = None):
+        """Merge part files into the final outputs, joining fact exports on the way"""
+        fieldnames = self.schema['output_fieldnames']
+        transform = None
+
+        if fact_files:
+            self.fact_join = FactJoin(self.parse_date, self.schema)
+
+            for part_path in output_parts:
+                with open(part_path, 'r', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        self.fact_join.add_plan_row(row)
+
+            self.fact_join.scan(fact_files)
+            fieldnames = fieldnames + [self.output_columns['variance']]
+            transform = self.fact_join.apply
+
+        output_count = self.merge_parts(output_parts, output_file, fieldnames, transform)
+        print(f"  ✓ Successfully written {output_count} rows to {output_file}")
+
+        report_count = self.merge_parts(report_parts, report_file, MATCH_REPORT_FIELDNAMES)
+        print(f"  ✓ Successfully written {report_count} matches to {report_file}")
+
+    def consolidate_sharded(self, gap_file: str, workers: Optional[int] = None,
+                            shard_by: str = 'section', shard_size: int = 5000,
+                            output_file: str = 'Final_Integrated_Plan.csv',
+                            report_file: str = 'Match_Report.csv',
+                            fact_files: Optional[List[str]] = None):
+        """
+        Sharded parallel consolidation for very large GAP files
+
+        The GAP file is split into shards (see split_gap_file), every shard is
+        matched and exploded in a worker process that writes temporary part
+        files, and the parts are k-way merged by original GAP row number so
+        the outputs are identical to a serial run. Fact exports are joined
+        while merging (see join_facts).
+        """
+        import multiprocessing
+        import shutil
+        import tempfile
+
+        print(f"\nConsolidating GAP Analysis in shards: {gap_file}")
+
+        work_dir = tempfile.mkdtemp(prefix='gap_shards_')
+
+        try:
+            shard_paths = self.split_gap_file(gap_file, work_dir, shard_by, shard_size)
+            print(f"  Shards ({shard_by}): {len(shard_paths)}")
+
+            workers = workers or os.cpu_count() or 1
+            jobs = [(path, work_dir) for path in shard_paths]
+
+            with multiprocessing.Pool(min(workers, max(1, len(jobs))),
+                                      initializer=_init_shard_worker,
+                                      initargs=(self.schema, self.matching_state())) as pool:
+                results = pool.map(_run_shard_worker, jobs, chunksize=1)
+
+            matched_count = sum(r[2] for r in results)
+            unmatched_count = sum(r[3] for r in results)
+
+            for result in results:
+                self.rollup.merge(result[4])
+
+            print(f"  ✓ Matched: {matched_count}")
+            print(f"  ✓ Unmatched (Backlog): {unmatched_count}")
+
+            self.write_parts([r[0] for r in results], [r[1] for r in results],
+                             output_file, report_file, fact_files)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def consolidate_checkpointed(self, gap_file: str, checkpoint_file: str,
+                                 every_rows: int = CHECKPOINT_ROWS, every_seconds: float = CHECKPOINT_SECONDS,
+                                 resume: bool = False,
+                                 output_file: str = 'Final_Integrated_Plan.csv',
+                                 report_file: str = 'Match_Report.csv',
+                                 fact_files: Optional[List[str]] = None) -> bool:
+        """
+        Resumable streaming consolidation for long runs
+
+        GAP rows are streamed and their output rows and match report entries
+        appended to "<file>.partial" part files. Every `every_rows` rows or
+        `every_seconds` seconds the part files are flushed and a checkpoint
+        (GAP rows done, part file sizes, counts, rollup) atomically replaces
+        checkpoint_file. With resume=True the part files are truncated to the
+        checkpointed sizes and processing continues after the checkpointed
+        row, so the final outputs are identical to an uninterrupted run.
+        A checkpoint is only resumed if the GAP file, sprint map, schema and
+        matcher options still match its fingerprints.
+        """
+        import time
+        from itertools import islice
+
+        print(f"\nConsolidating GAP Analysis with checkpoints: {gap_file}")
+
+        output_part = output_file + '.partial'
+        report_part = report_file + '.partial'
+        feature_column = self.gap_columns['feature']
+
+        fingerprints = self.checkpoint_fingerprints(gap_file)
+
+        state = None
+        if resume:
+            state = self.read_checkpoint(checkpoint_file, fingerprints)
+            if state is False:
+                return False
+
+        if state:
+            for path, size in ((output_part, state['output_size']), (report_part, state['report_size'])):
+                if not os.path.exists(path) or os.path.getsize(path) < size:
+                    print(f"  ✗ Part file {path} is missing or shorter than checkpoint {checkpoint_file}")
+                    return False
+
+            for path, size in ((output_part, state['output_size']), (report_part, state['report_size'])):
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+            self.rollup.load_state(state['rollup'])
+            rows_done = state['rows_done']
+            matched_count = state['matched']
+            unmatched_count = state['unmatched']
+            print(f"  Resuming after GAP row {rows_done}")
+        else:
+            rows_done = matched_count = unmatched_count = 0
+
+        mode = 'a' if state else 'w'
+
+        with open(gap_file, 'r', encoding='utf-8') as gap_f, \
+                open(output_part, mode, encoding='utf-8', newline='') as output_f, \
+                open(report_part, mode, encoding='utf-8', newline='') as report_f:
+            output_writer = csv.DictWriter(output_f, fieldnames=self.part_fieldnames())
+            report_writer = csv.DictWriter(report_f, fieldnames=[ROW_COLUMN] + MATCH_REPORT_FIELDNAMES)
+
+            if not state:
+                output_writer.writeheader()
+                report_writer.writeheader()
+
+            reader = csv.DictReader(gap_f)
+            for _ in islice(reader, rows_done):
+                pass
+
+            last_checkpoint = time.monotonic()
+            rows_since_checkpoint = 0
+
+            while True:
+                batch = list(islice(reader, every_rows or CHECKPOINT_ROWS))
+                if not batch:
+                    break
+
+                if self.exact_index is not None:
+                    self.index_reverse_containment([row.get(feature_column, '') for row in batch])
+
+                for gap_row in batch:
+                    result = self.process_gap_row(gap_row)
+
+                    if result is not None:
+                        rows, report_entry = result
+                        self.rollup.add(gap_row, rows, report_entry['Sprint'] if report_entry else 'Backlog')
+                        self.write_part_rows(output_writer, report_writer, rows_done, rows, report_entry)
+
+                        if report_entry:
+                            matched_count += 1
+                        else:
+                            unmatched_count += 1
+
+                    rows_done += 1
+                    rows_since_checkpoint += 1
+
+                    if ((every_rows and rows_since_checkpoint >= every_rows) or
+                            (every_seconds and time.monotonic() - last_checkpoint >= every_seconds)):
+                        self.write_checkpoint(checkpoint_file, {
+                            'fingerprints': fingerprints,
+                            'rows_done': rows_done,
+                            'output_size': self.flush_part(output_f),
+                            'report_size': self.flush_part(report_f),
+                            'matched': matched_count,
+                            'unmatched': unmatched_count,
+                            'rollup': self.rollup.state(),
+                        })
+                        last_checkpoint = time.monotonic()
+                        rows_since_checkpoint = 0
+
+        print(f"  ✓ Matched: {matched_count}")
+        print(f"  ✓ Unmatched (Backlog): {unmatched_count}")
+
+        self.write_parts([output_part], [report_part], output_file, report_file, fact_files)
+
+        for path in (output_part, report_part, checkpoint_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+        return True
+
+    @staticmethod
+    def flush_part(handle) -> int:
+        """Flush a part file to disk and return its size in bytes"""
+        handle.flush()
+        os.fsync(handle.fileno())
+        return os.fstat(handle.fileno()).st_size
+
+    def write_checkpoint(self, checkpoint_file: str, state: Dict):
+        """Atomically replace the checkpoint file"""
+        import json
+
+        tmp_file = checkpoint_file + '.tmp'
+
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_file, checkpoint_file)
+        print(f"  ✓ Checkpoint: {state['rows_done']} GAP rows")
+
+    def checkpoint_fingerprints(self, gap_file: str) -> Dict[str, str]:
+        """Digests of everything a checkpoint's rows depend on"""
+        import hashlib
+        import json
+
+        def digest(value) -> str:
+            text = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+            return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+        gap_digest = hashlib.blake2b(digest_size=16)
+        with open(gap_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                gap_digest.update(chunk)
+
+        return {
+            'GAP file': gap_digest.hexdigest(),
+            # Catalogue order decides ties, so the sprint map is hashed in order
+            'sprint map': digest(list(self.sprint_map.items())),
+            'schema': digest(self.schema),
+            'matcher setup': digest({
+                'cascade': self.exact_index is not None,
+                'lsh': [self.lsh.bands, self.lsh.rows] if self.lsh is not None else None,
+                'trigram_candidates': self.trigram_candidates,
+                'stem_keywords': self.stem_keywords,
+            }),
+        }
+
+    def read_checkpoint(self, checkpoint_file: str, fingerprints: Dict[str, str]):
+        """Checkpoint state to resume from, None to start over, False if it does not fit the inputs"""
+        import json
+
+        if not os.path.exists(checkpoint_file):
+            print(f"  No checkpoint {checkpoint_file}, starting from the first GAP row")
+            return None
+
+        try:
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            print(f"  ✗ Error reading checkpoint {checkpoint_file}: {e}")
+            return False
+
+        checkpointed = state.get('fingerprints') or {}
+        for name, fingerprint in fingerprints.items():
+            if checkpointed.get(name) != fingerprint:
+                print(f"  ✗ Checkpoint {checkpoint_file} was written for a different {name}")
+                return False
+
+        return state
+
+    def merge_parts(self, part_paths: List[str], output_file: str, fieldnames: List[str],
+                    transform=None) -> int:
+        """K-way merge of part files ordered by original GAP row number"""
+        handles = [open(path, 'r', encoding='utf-8') for path in part_paths]
+        count = 0
+
+        try:
+            readers = [csv.DictReader(handle) for handle in handles]
+            merged = heapq.merge(*readers, key=lambda row: int(row[ROW_COLUMN]))
+
+            with open(output_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                writer.writeheader()
+
+                for row in merged:
+                    writer.writerow(transform(row) if transform else row)
+                    count += 1
+        finally:
+            for handle in handles:
+                handle.close()
+
+        return count
+
+    def join_facts(self, fact_files: List[str]):
+        """
+        Fill actual dates and hours from timesheet/fact exports
+
+        Activity rows are joined by (sprint task, Тип робіт), or by
+        (Деталізація, Тип робіт) for fact rows without a known sprint task.
+        """
+        print("\nJoining fact exports...")
+
+        self.fact_join = FactJoin(self.parse_date, self.schema)
+
+        for row in self.output_rows:
+            self.fact_join.add_plan_row(row)
+
+        self.fact_join.scan(fact_files)
+
+        for row in self.output_rows:
+            self.fact_join.apply(row)
+
     def write_output(self, output_file: str = 'Final_Integrated_Plan.csv'):
         """Write consolidated plan to CSV"""
         print(f"\nWriting output to: {output_file}")
 
-        fieldnames = [
-            'Розділ',
-            'Деталізація',
-            'Тип робіт',
-            'Статус',
-            'Учасники від замовника',
-            'Учасники від виконавця',
-            'Днів на виконання (робочих)',
-            'Дата початку план',
-            'Дата закінчення план',
-            'Дата початку факт',
-            'Дата закінчення факт',
-            'Облік часу (план)',
-            'Облік часу (факт)',
-            'Коментарі'
-        ]
+        fieldnames = self.schema['output_fieldnames']
+        if self.fact_join:
+            fieldnames = fieldnames + [self.output_columns['variance']]
 
         try:
             with open(output_file, 'w', encoding='utf-8', newline='') as f:
@@ -451,7 +1675,7 @@ class ProjectPlanConsolidator:
 
         try:
             with open(report_file, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['GAP Feature', 'Sprint Task', 'Match Score', 'Sprint'])
+                writer = csv.DictWriter(f, fieldnames=MATCH_REPORT_FIELDNAMES)
                 writer.writeheader()
                 writer.writerows(self.match_report)
 
@@ -459,30 +1683,324 @@ class ProjectPlanConsolidator:
         except Exception as e:
             print(f"  ✗ Error writing report: {e}")
 
+    def write_summary(self, summary_file: str = 'Plan_Summary.csv'):
+        """Write plan rollups per sprint, section and work type"""
+        print(f"\nWriting plan summary to: {summary_file}")
 
-def main():
-    """Main execution function"""
-    print("="*70)
-    print("PROJECT DOCUMENTATION CONSOLIDATION v2")
-    print("="*70)
+        rows = self.rollup.summary_rows(self.sprint_map)
+
+        try:
+            with open(summary_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['Dimension', 'Value', 'Plan Hours', 'Features', 'Critical',
+                                                       'Activities', 'Capacity (год)', 'Utilisation'])
+                writer.writeheader()
+                writer.writerows(rows)
+
+            print(f"  ✓ Successfully written {len(rows)} rollups")
+        except Exception as e:
+            print(f"  ✗ Error writing summary: {e}")
+
+    def threshold_sweep(self, thresholds: List[float], k: int = 3,
+                        baseline: float = MATCH_THRESHOLD) -> Dict:
+        """
+        Evaluate many match thresholds from a single matching pass
+
+        The top k candidates of every GAP feature are computed once with the
+        lowest threshold as floor; the best candidate decides the assignment
+        at every threshold above it.
+        """
+        print(f"\nSweeping {len(thresholds)} thresholds ({min(thresholds):.2f}-{max(thresholds):.2f})...")
+
+        floor = min(thresholds + [baseline])
+        features = []
+
+        if self.exact_index is not None:
+            self.index_reverse_containment([row.get(self.gap_columns['feature'], '') for row in self.gap_data])
+
+        for gap_row in self.gap_data:
+            feature = gap_row.get(self.gap_columns['feature'], '').strip()
+            if feature:
+                features.append((feature, self.top_matches(feature, k, floor)))
+
+        def assignment(candidates, threshold):
+            if candidates and candidates[0][1] > threshold:
+                return candidates[0][0]
+            return None
+
+        summary = []
+        changes = []
+
+        for threshold in thresholds:
+            matched_count = 0
+            changed_count = 0
+
+            for feature, candidates in features:
+                sprint_task = assignment(candidates, threshold)
+                baseline_task = assignment(candidates, baseline)
+
+                if sprint_task:
+                    matched_count += 1
+
+                if sprint_task != baseline_task:
+                    changed_count += 1
+                    changes.append({
+                        'Threshold': f'{threshold:.2f}',
+                        'GAP Feature': feature,
+                        f'Sprint Task ({baseline:.2f})': baseline_task or 'Backlog',
+                        'Sprint Task': sprint_task or 'Backlog',
+                        'Match Score': f'{candidates[0][1]:.2f}'
+                    })
+
+            summary.append({
+                'Threshold': f'{threshold:.2f}',
+                'Matched': matched_count,
+                'Backlog': len(features) - matched_count,
+                'Match Rate': f'{matched_count / len(features):.1%}' if features else '',
+                f'Changed vs {baseline:.2f}': changed_count
+            })
+
+            print(f"  {threshold:.2f}: {matched_count} matched, {changed_count} changed vs {baseline:.2f}")
+
+        # Histogram of best-candidate scores in 0.05 bins
+        histogram = {}
+        for _, candidates in features:
+            bin_start = min(int(candidates[0][1] * 20), 19) / 20 if candidates else None
+            histogram[bin_start] = histogram.get(bin_start, 0) + 1
+
+        # Features without any candidate above the floor
+        below_floor = histogram.pop(None, 0)
+
+        histogram_rows = [{
+            'Score From': f'{bin_start:.2f}',
+            'Score To': f'{bin_start + 0.05:.2f}',
+            'Requirements': count
+        } for bin_start, count in sorted(histogram.items())]
+
+        if below_floor:
+            histogram_rows.insert(0, {'Score From': '', 'Score To': f'{floor:.2f}', 'Requirements': below_floor})
+
+        candidate_rows = [{
+            'GAP Feature': feature,
+            'Rank': rank,
+            'Sprint Task': sprint_task,
+            'Match Score': f'{score:.2f}',
+            'Sprint': self.sprint_map[sprint_task]['sprint_num']
+        } for feature, candidates in features
+            for rank, (sprint_task, score) in enumerate(candidates, 1)]
+
+        return {
+            'summary': summary,
+            'changes': changes,
+            'histogram': histogram_rows,
+            'candidates': candidate_rows,
+        }
+
+    def write_sweep_report(self, sweep: Dict, prefix: str = 'Match_Report'):
+        """Write threshold sweep results next to the match report"""
+        files = [
+            (f'{prefix}_Sweep.csv', sweep['summary']),
+            (f'{prefix}_Sweep_Changes.csv', sweep['changes']),
+            (f'{prefix}_Score_Histogram.csv', sweep['histogram']),
+            (f'{prefix}_Candidates.csv', sweep['candidates']),
+        ]
+
+        for report_file, rows in files:
+            print(f"\nWriting sweep report to: {report_file}")
 
-    consolidator = ProjectPlanConsolidator()
+            if not rows:
+                print("  - Nothing to write")
+                continue
+
+            try:
+                with open(report_file, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                    writer.writeheader()
+                    writer.writerows(rows)
+
+                print(f"  ✓ Successfully written {len(rows)} rows")
+            except Exception as e:
+                print(f"  ✗ Error writing report: {e}")
+
+
+# Per-process consolidator used by shard workers
+_shard_consolidator = None
+
+
+def _init_shard_worker(schema: Dict, matching_state: Dict):
+    """Receive the schema, sprint map and match indexes once per worker process"""
+    global _shard_consolidator
+    _shard_consolidator = ProjectPlanConsolidator(schema)
+    _shard_consolidator.__dict__.update(matching_state)
+
+
+def _run_shard_worker(job: Tuple[str, str]) -> Tuple[str, str, int, int, PlanRollup]:
+    shard_path, part_dir = job
+    _shard_consolidator.rollup = PlanRollup(_shard_consolidator.schema)
+    return _shard_consolidator.consolidate_shard(shard_path, part_dir)
+
+
+COMMANDS = ['consolidate', 'match', 'report', 'compile-index', 'diff', 'bench']
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    argv = list(sys.argv[1:] if argv is None else argv)
+
+    # Without a subcommand behave like earlier versions: consolidate
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv.insert(0, 'consolidate')
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', help='JSON schema file overriding file names, columns and coverage templates')
+
+    matcher = argparse.ArgumentParser(add_help=False)
+    matcher.add_argument('--index', help='Load sprint tasks and match indexes saved by compile-index')
+    matcher.add_argument('--lsh', action='store_true',
+                         help='Only rescore sprint tasks retrieved by MinHash/LSH (approximate)')
+    matcher.add_argument('--lsh-bands', type=int, default=32,
+                         help='LSH bands (more bands → higher recall)')
+    matcher.add_argument('--lsh-rows', type=int, default=2,
+                         help='MinHash rows per band (more rows → higher precision)')
+    matcher.add_argument('--trigram-candidates', type=int, default=0,
+                         help='Limit the SequenceMatcher fallback to the top N tasks by shared trigrams')
+    matcher.add_argument('--exhaustive', action='store_true',
+                         help='Score every sprint task pairwise instead of using the match cascade')
+    matcher.add_argument('--no-stemming', action='store_true',
+                         help='Compare raw keyword forms instead of Ukrainian stems')
+
+    parser = argparse.ArgumentParser(description='Merge GAP Analysis with Sprint Plans')
+    subparsers = parser.add_subparsers(dest='command', metavar='{' + ','.join(COMMANDS) + '}')
+
+    consolidate = subparsers.add_parser('consolidate', parents=[common, matcher],
+                                        help='Build the integrated plan, match report and plan summary (default)')
+    consolidate.add_argument('--gap-file', help='GAP Analysis CSV file')
+    consolidate.add_argument('--workers', type=int, default=0,
+                             help='Run sharded consolidation with this many worker processes')
+    consolidate.add_argument('--shard-by', choices=['section', 'rows'], default='section',
+                             help='Split the GAP file by section or by fixed row ranges')
+    consolidate.add_argument('--shard-size', type=int, default=5000,
+                             help='Rows per shard when --shard-by rows')
+    consolidate.add_argument('--facts', nargs='+', default=[],
+                             help='Timesheet/fact CSV exports to join onto the activity rows')
+    consolidate.add_argument('--checkpoint-every', type=int, default=0,
+                             help=f'Checkpoint every N GAP rows (resumable run; default {CHECKPOINT_ROWS} with --resume)')
+    consolidate.add_argument('--checkpoint-seconds', type=float, default=0,
+                             help=f'Checkpoint every T seconds (default {CHECKPOINT_SECONDS} with --resume)')
+    consolidate.add_argument('--checkpoint', default='Final_Integrated_Plan.checkpoint.json',
+                             help='Checkpoint file of a resumable run')
+    consolidate.add_argument('--resume', action='store_true',
+                             help='Continue an interrupted resumable run from its last checkpoint')
+
+    match = subparsers.add_parser('match', parents=[common, matcher],
+                                  help='Print the best sprint tasks for requirement texts as CSV')
+    match.add_argument('texts', nargs='*', help='Requirement texts (default: one per line from stdin)')
+    match.add_argument('--top-k', type=int, default=1, help='Candidates per requirement')
+    match.add_argument('--threshold', type=float, help='Score a sprint task has to exceed')
+
+    report = subparsers.add_parser('report', parents=[common, matcher],
+                                   help='Evaluate a range of match thresholds and write the sweep reports')
+    report.add_argument('--gap-file', help='GAP Analysis CSV file')
+    report.add_argument('--sweep-from', type=float, default=0.30, help='Lowest threshold to evaluate')
+    report.add_argument('--sweep-to', type=float, default=0.95, help='Highest threshold to evaluate')
+    report.add_argument('--sweep-step', type=float, default=0.05, help='Threshold step')
+    report.add_argument('--top-k', type=int, default=3,
+                        help='Candidates per GAP feature kept for the sweep reports')
+
+    compile_index = subparsers.add_parser('compile-index', parents=[common, matcher],
+                                          help='Save sprint tasks and match indexes for fast match runs')
+    compile_index.add_argument('--output', default='match_index.pickle', help='Index file to write')
+
+    diff = subparsers.add_parser('diff', parents=[common],
+                                 help='Compare two generated plan files row by row')
+    diff.add_argument('old', help='Previous plan, e.g. a saved Final_Integrated_Plan.csv')
+    diff.add_argument('new', nargs='?', default='Final_Integrated_Plan.csv', help='Current plan')
+    diff.add_argument('--output', default='Plan_Diff.csv', help='Added, removed and changed rows')
+    diff.add_argument('--summary', default='Plan_Diff_Summary.csv', help='Change counts per sprint')
+
+    # Handled in main() before parsing; listed here for --help
+    subparsers.add_parser('bench', add_help=False, help='Run the regression gate (see regression_gate.py)')
+
+    return parser.parse_args(argv)
+
+
+def prepare_matcher(args: argparse.Namespace, schema: Dict) -> Optional[ProjectPlanConsolidator]:
+    """Consolidator with the sprint map and match indexes selected by the options (None if they conflict)"""
+    if args.index:
+        # The matching path is fixed when the index is compiled
+        options = [option for option, given in (('--lsh', args.lsh),
+                                                ('--trigram-candidates', args.trigram_candidates),
+                                                ('--exhaustive', args.exhaustive)) if given]
+        if options:
+            print(f"  ✗ {', '.join(options)} cannot be combined with --index; pass to compile-index instead")
+            return None
+
+    consolidator = ProjectPlanConsolidator(schema)
+
+    if args.index:
+        consolidator.load_index(args.index)
+        return consolidator
 
     # Step 1: Read Sprint files
     consolidator.read_sprint_files()
 
-    # Step 2: Read GAP Analysis
-    gap_file = 'Gap Termi Community - today - GAP з модулем Appointments (1).csv'
-    consolidator.read_gap_analysis(gap_file)
+    if not args.exhaustive:
+        consolidator.build_match_cascade()
 
-    # Step 3: Consolidate
-    consolidator.consolidate()
+    if args.lsh:
+        consolidator.build_lsh_index(args.lsh_bands, args.lsh_rows)
 
-    # Step 4: Write output
-    consolidator.write_output()
+    if args.trigram_candidates:
+        consolidator.build_trigram_index(args.trigram_candidates)
 
-    # Step 5: Write match report
-    consolidator.write_match_report()
+    return consolidator
+
+
+def run_consolidate(args: argparse.Namespace, schema: Dict):
+    print("="*70)
+    print("PROJECT DOCUMENTATION CONSOLIDATION v2")
+    print("="*70)
+
+    checkpointed = args.checkpoint_every or args.checkpoint_seconds or args.resume
+    if args.workers and checkpointed:
+        print("  ✗ --workers cannot be combined with --resume / --checkpoint-every / --checkpoint-seconds")
+        return 1
+
+    consolidator = prepare_matcher(args, schema)
+    if consolidator is None:
+        return 1
+    gap_file = args.gap_file or schema['gap_file']
+
+    if args.workers:
+        # Steps 2-5: Sharded consolidation writes both output files
+        consolidator.consolidate_sharded(gap_file, args.workers,
+                                         args.shard_by, args.shard_size,
+                                         fact_files=args.facts)
+    elif checkpointed:
+        # Steps 2-5: Resumable consolidation writes both output files
+        every_rows, every_seconds = args.checkpoint_every, args.checkpoint_seconds
+        if not every_rows and not every_seconds:
+            every_rows, every_seconds = CHECKPOINT_ROWS, CHECKPOINT_SECONDS
+
+        if not consolidator.consolidate_checkpointed(gap_file, args.checkpoint, every_rows, every_seconds,
+                                                     args.resume, fact_files=args.facts):
+            return 1
+    else:
+        # Step 2: Read GAP Analysis
+        consolidator.read_gap_analysis(gap_file)
+
+        # Step 3: Consolidate
+        consolidator.consolidate()
+
+        if args.facts:
+            consolidator.join_facts(args.facts)
+
+        # Step 4: Write output
+        consolidator.write_output()
+
+        # Step 5: Write match report
+        consolidator.write_match_report()
+
+    # Step 6: Write rollups
+    consolidator.write_summary()
 
     print("\n" + "="*70)
     print("CONSOLIDATION COMPLETE")
@@ -490,7 +2008,120 @@ def main():
     print("\nGenerated files:")
     print("  1. Final_Integrated_Plan.csv - Main consolidated project plan")
     print("  2. Match_Report.csv - Detailed matching report")
+    print("  3. Plan_Summary.csv - Hours and capacity per sprint, section and work type")
+
+
+def run_match(args: argparse.Namespace, schema: Dict):
+    from contextlib import redirect_stdout
+
+    # Progress messages go to stderr so stdout stays valid CSV
+    with redirect_stdout(sys.stderr):
+        consolidator = prepare_matcher(args, schema)
+    if consolidator is None:
+        return 1
+
+    from itertools import islice
+
+    threshold = schema['match_threshold'] if args.threshold is None else args.threshold
+    texts = iter(args.texts or (line.strip() for line in sys.stdin))
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=['GAP Feature', 'Rank', 'Sprint Task', 'Match Score', 'Sprint'])
+    writer.writeheader()
+
+    while True:
+        chunk = list(islice(texts, MATCH_BATCH_ROWS))
+        if not chunk:
+            break
+
+        batch = [text for text in chunk if text]
+
+        if consolidator.exact_index is not None:
+            consolidator.index_reverse_containment(batch)
+
+        for text in batch:
+            for rank, (sprint_task, score) in enumerate(consolidator.top_matches(text, args.top_k, threshold), 1):
+                writer.writerow({
+                    'GAP Feature': text,
+                    'Rank': rank,
+                    'Sprint Task': sprint_task,
+                    'Match Score': f'{score:.2f}',
+                    'Sprint': consolidator.sprint_map[sprint_task]['sprint_num']
+                })
+
+
+def run_report(args: argparse.Namespace, schema: Dict):
+    print("="*70)
+    print("MATCH THRESHOLD SWEEP")
+    print("="*70)
+
+    consolidator = prepare_matcher(args, schema)
+    if consolidator is None:
+        return 1
+
+    steps = int(round((args.sweep_to - args.sweep_from) / args.sweep_step))
+    thresholds = [round(args.sweep_from + i * args.sweep_step, 4) for i in range(steps + 1)]
+
+    consolidator.read_gap_analysis(args.gap_file or schema['gap_file'])
+    sweep = consolidator.threshold_sweep(thresholds, args.top_k, schema['match_threshold'])
+    consolidator.write_sweep_report(sweep)
+
+    print("\n" + "="*70)
+    print("THRESHOLD SWEEP COMPLETE")
+    print("="*70)
+
+
+def run_compile_index(args: argparse.Namespace, schema: Dict):
+    if args.index:
+        print("  ✗ compile-index builds the index from the Sprint files; drop --index")
+        return 1
+
+    consolidator = prepare_matcher(args, schema)
+    consolidator.save_index(args.output)
+
+
+def run_diff(args: argparse.Namespace, schema: Dict):
+    print("="*70)
+    print("PLAN DIFF")
+    print("="*70)
+
+    plan_diff = PlanDiff(schema)
+
+    try:
+        plan_diff.diff(args.old, args.new, args.output)
+    except Exception as e:
+        print(f"  ✗ Error diffing plans: {e}")
+        return 1
+
+    plan_diff.write_summary(args.summary)
+
+    print("\n" + "="*70)
+    print("PLAN DIFF COMPLETE")
+    print("="*70)
+
+
+def main(argv: Optional[List[str]] = None) -> Optional[int]:
+    """Main execution function"""
+    argv = list(sys.argv[1:] if argv is None else argv)
+
+    if argv and argv[0] == 'bench':
+        from regression_gate import main as bench
+        return bench(argv[1:])
+
+    args = parse_args(argv)
+    schema = load_schema(args.config)
+
+    if getattr(args, 'no_stemming', False):
+        schema['stem_keywords'] = False
+
+    commands = {
+        'consolidate': run_consolidate,
+        'match': run_match,
+        'report': run_report,
+        'compile-index': run_compile_index,
+        'diff': run_diff,
+    }
+    return commands[args.command](args, schema)
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
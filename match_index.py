@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Candidate Retrieval Indexes
+Approximate lookup structures that narrow the Sprint task catalogue down to
+the few tasks worth scoring exactly for a given GAP requirement
+"""
+
+import hashlib
+import heapq
+from collections import deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+# random is only needed to draw the MinHash coefficients, so it is imported
+# there; unpickling a compiled index stays cheap.
+
+
+class MinHashLSH:
+    """
+    MinHash signatures over keyword sets with banded LSH buckets
+
+    Two keyword sets with Jaccard similarity s share at least one bucket with
+    probability 1 - (1 - s^rows)^bands:
+    - more bands → higher recall (more candidates)
+    - more rows  → higher precision (fewer, closer candidates)
+    """
+
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, bands: int = 32, rows: int = 2, seed: int = 1):
+        import random
+
+        self.bands = bands
+        self.rows = rows
+
+        rng = random.Random(seed)
+        self.coefficients = [
+            (rng.randrange(1, self.PRIME), rng.randrange(0, self.PRIME))
+            for _ in range(bands * rows)
+        ]
+        self.buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+        self.unhashed: List[int] = []  # items without keywords, returned by every query
+
+    @staticmethod
+    def token_hash(token: str) -> int:
+        """Stable 64-bit token hash (independent of PYTHONHASHSEED)"""
+        return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def signature(self, keywords: Iterable[str]) -> List[int]:
+        """MinHash signature of a keyword set"""
+        hashes = [self.token_hash(token) for token in keywords]
+        prime = self.PRIME
+
+        return [min((a * h + b) % prime for h in hashes) for a, b in self.coefficients]
+
+    def band_keys(self, keywords: Iterable[str]) -> List[Tuple[int, ...]]:
+        signature = self.signature(keywords)
+        rows = self.rows
+
+        return [tuple(signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, item_id: int, keywords: Set[str]):
+        """Index an item by its keyword set (items without keywords always match)"""
+        if not keywords:
+            self.unhashed.append(item_id)
+            return
+
+        for bucket, key in zip(self.buckets, self.band_keys(keywords)):
+            bucket.setdefault(key, []).append(item_id)
+
+    def query(self, keywords: Set[str]) -> Set[int]:
+        """
+        Return ids of all items sharing at least one band bucket, plus the
+        items indexed without keywords (an empty query only gets those)
+        """
+        candidates = set(self.unhashed)
+
+        if not keywords:
+            return candidates
+
+        for bucket, key in zip(self.buckets, self.band_keys(keywords)):
+            candidates.update(bucket.get(key, ()))
+
+        return candidates
+
+
+class TrigramIndex:
+    """
+    Character-trigram posting lists over normalized task texts
+
+    Returns the items sharing the most trigrams with a query, so the
+    expensive SequenceMatcher comparison only runs on a short list.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def trigrams(text: str) -> Set[str]:
+        padded = f' {text} '
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, item_id: int, text: str):
+        for trigram in self.trigrams(text):
+            self.postings.setdefault(trigram, []).append(item_id)
+
+    def query(self, text: str, limit: int) -> List[int]:
+        """Ids of the top `limit` items by shared-trigram count (ties → lower id)"""
+        counts: Dict[int, int] = {}
+
+        for trigram in self.trigrams(text):
+            for item_id in self.postings.get(trigram, ()):
+                counts[item_id] = counts.get(item_id, 0) + 1
+
+        return heapq.nsmallest(limit, counts, key=lambda item_id: (-counts[item_id], item_id))
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a set of patterns
+
+    One linear pass over a text reports every indexed pattern it contains.
+    """
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[List[int]] = [[]]
+        self.output_link: List[int] = [-1]  # nearest suffix state with outputs
+        self.built = False
+
+    def add(self, pattern: str, item_id: int):
+        if not pattern:
+            return
+
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.output_link.append(-1)
+                self.goto[state][char] = next_state
+            state = next_state
+
+        self.outputs[state].append(item_id)
+        self.built = False
+
+    def build(self):
+        """Compute failure and output links (breadth-first)"""
+        queue = deque(self.goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                fail_state = self.goto[fallback].get(char, 0)
+
+                self.fail[next_state] = fail_state
+                self.output_link[next_state] = (
+                    fail_state if self.outputs[fail_state] else self.output_link[fail_state]
+                )
+
+        self.built = True
+
+    def find_all(self, text: str) -> Set[int]:
+        """Ids of all patterns occurring in text"""
+        if not self.built:
+            self.build()
+
+        found = set()
+        goto, fail, outputs, output_link = self.goto, self.fail, self.outputs, self.output_link
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            match_state = state if outputs[state] else output_link[state]
+            while match_state > 0:
+                found.update(outputs[match_state])
+                match_state = output_link[match_state]
+
+        return found
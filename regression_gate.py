@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+End-to-End Regression Gate
+Runs every consolidation engine on the sample inputs and on scaled synthetic
+inputs, diffs the outputs against golden files row by row and compares
+throughput and peak memory against the recorded baseline
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from consolidate_project_plan_v2 import GAP_FILE, stem_word
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(REPO_DIR, 'golden')
+BASELINE_FILE = os.path.join(GOLDEN_DIR, 'throughput.json')
+
+# Timesheet export joined by the --facts engines
+FACTS_FIXTURE = os.path.join(GOLDEN_DIR, 'fixtures', 'timesheet.csv')
+
+SPRINT_PATTERN = '*Спринт*.csv'
+OUTPUT_FILES = ['Final_Integrated_Plan.csv', 'Match_Report.csv']
+
+# name → (command line, golden set the outputs must match)
+ENGINES = {
+    'v1': (['consolidate_project_plan.py'], 'v1'),
+    'v2': (['consolidate_project_plan_v2.py', 'consolidate'], 'v2'),
+    'v2-exhaustive': (['consolidate_project_plan_v2.py', 'consolidate', '--exhaustive'], 'v2'),
+    'v2-sharded': (['consolidate_project_plan_v2.py', 'consolidate', '--workers', '2'], 'v2'),
+    'v2-checkpoint': (['consolidate_project_plan_v2.py', 'consolidate', '--checkpoint-every', '10'], 'v2'),
+    'v2-facts': (['consolidate_project_plan_v2.py', 'consolidate', '--facts', FACTS_FIXTURE], 'v2-facts'),
+    'v2-facts-sharded': (['consolidate_project_plan_v2.py', 'consolidate', '--workers', '2',
+                          '--facts', FACTS_FIXTURE], 'v2-facts'),
+}
+
+# name → checkpoint file: the engine is killed once it appears and re-run with --resume
+RESUMED_ENGINES = {
+    'v2-checkpoint': 'Final_Integrated_Plan.checkpoint.json',
+}
+
+# Inflected forms that stem_word has to reduce to one stem each
+STEM_PARADIGMS = [
+    ['картка', 'картки', 'карток', 'картку', 'карткою'],
+    ['оплата', 'оплати', 'оплату', 'оплат', 'оплатою'],
+    ['візит', 'візити', 'візиту', 'візитів', 'візитами'],
+    ['зарплата', 'зарплати', 'зарплату'],
+    ['школа', 'школи', 'школу'],
+    ['клієнт', 'клієнта', 'клієнти', 'клієнтів'],
+]
+
+DATASETS = ['sample', 'synthetic']
+
+# Sample runs take ~2 s and are dominated by interpreter start-up, so only
+# the synthetic dataset is compared against the throughput baseline
+THROUGHPUT_DATASETS = ['synthetic']
+
+
+def prepare_sample(target_dir: str):
+    """Copy the checked-in GAP and Sprint files"""
+    for path in [GAP_FILE] + glob.glob(os.path.join(REPO_DIR, SPRINT_PATTERN)):
+        shutil.copy(os.path.join(REPO_DIR, path), target_dir)
+
+
+def prepare_synthetic(target_dir: str, scale: int):
+    """
+    Scale the sample inputs by `scale`
+
+    Every GAP requirement gets scale - 1 deterministic word-shuffled copies,
+    and every Sprint file gets scale - 1 renamed copies with renumbered tasks.
+    """
+    with open(os.path.join(REPO_DIR, GAP_FILE), 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        gap_rows = list(reader)
+
+    with open(os.path.join(target_dir, GAP_FILE), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for copy in range(scale):
+            rng = random.Random(copy)
+            for row in gap_rows:
+                row = dict(row)
+                if copy and row.get('Вимога', '').strip():
+                    words = row['Вимога'].split()
+                    rng.shuffle(words)
+                    row['Вимога'] = ' '.join(words)
+                writer.writerow(row)
+
+    for sprint_file in sorted(glob.glob(os.path.join(REPO_DIR, SPRINT_PATTERN))):
+        name = os.path.basename(sprint_file)
+        shutil.copy(sprint_file, target_dir)
+
+        with open(sprint_file, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames
+            sprint_rows = list(reader)
+
+        sprint_num = name.split()[0]
+        for copy in range(1, scale):
+            copy_name = f'{int(sprint_num) + 10 * copy} Спринт - синтетичний.csv'
+            with open(os.path.join(target_dir, copy_name), 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+
+                for row in sprint_rows:
+                    row = dict(row)
+                    task = row.get('Задача', '').strip()
+                    if task and not task.startswith('Всього'):
+                        row['Задача'] = f'{task} (пакет {copy})'
+                    writer.writerow(row)
+
+
+def count_gap_rows(work_dir: str) -> int:
+    with open(os.path.join(work_dir, GAP_FILE), 'r', encoding='utf-8') as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def run_engine(command: List[str], work_dir: str, kill_on: Optional[str] = None) -> Tuple[int, float, int]:
+    """
+    Run one engine in work_dir and return (exit code, seconds, peak RSS in KB)
+
+    With kill_on the engine is SIGKILLed as soon as it creates that file; the
+    exit code is then -SIGKILL.
+    """
+    for script in glob.glob(os.path.join(REPO_DIR, '*.py')):
+        shutil.copy(script, work_dir)
+
+    with open(os.path.join(work_dir, 'engine.log'), 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable] + command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+
+        # wait4 reports the peak RSS of this child (and the workers it waited for)
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG if kill_on else 0)
+        while not pid:
+            if os.path.exists(os.path.join(work_dir, kill_on)):
+                proc.kill()
+            time.sleep(0.005)
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        elapsed = time.perf_counter() - start
+
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    return proc.returncode, elapsed, usage.ru_maxrss
+
+
+def run_resumed(command: List[str], work_dir: str, checkpoint_file: str) -> Optional[Tuple[int, float, int]]:
+    """
+    Kill an engine at its first checkpoint and finish the run with --resume
+
+    Returns the combined (exit code, seconds, peak RSS in KB), or None if the
+    engine finished before it wrote a checkpoint.
+    """
+    interrupted = run_engine(command, work_dir, kill_on=checkpoint_file)
+    if interrupted[0] != -signal.SIGKILL:
+        return None
+
+    resumed = run_engine(command + ['--resume'], work_dir)
+    return resumed[0], interrupted[1] + resumed[1], max(interrupted[2], resumed[2])
+
+
+def diff_csv(actual_file: str, golden_file: str, limit: int = 5) -> List[str]:
+    """Row-by-row differences between two CSV files"""
+    with open(actual_file, 'r', encoding='utf-8') as f:
+        actual = list(csv.reader(f))
+    with open(golden_file, 'r', encoding='utf-8') as f:
+        golden = list(csv.reader(f))
+
+    differences = []
+
+    for line, (actual_row, golden_row) in enumerate(zip(actual, golden), 1):
+        if actual_row != golden_row:
+            differences.append(f'line {line}: expected {golden_row} got {actual_row}')
+
+    if len(actual) != len(golden):
+        differences.append(f'row count: expected {len(golden)} got {len(actual)}')
+
+    if len(differences) > limit:
+        differences = differences[:limit] + [f'... {len(differences) - limit} more']
+
+    return differences
+
+
+def dataset_name(dataset: str, scale: int) -> str:
+    """Golden/baseline name of a dataset (synthetic outputs depend on the scale)"""
+    return f'{dataset}-x{scale}' if dataset == 'synthetic' else dataset
+
+
+def check_engine(engine: str, dataset: str, scale: int, repeat: int, update: bool) -> Dict:
+    """
+    Run one engine on one dataset and compare its outputs with the golden files
+
+    Throughput datasets are run `repeat` times and the best run is reported,
+    so one slow run on a busy machine does not fail the gate.
+    """
+    command, golden_set = ENGINES[engine]
+    golden_dir = os.path.join(GOLDEN_DIR, golden_set, dataset_name(dataset, scale))
+    work_dir = tempfile.mkdtemp(prefix='gap_gate_')
+
+    try:
+        if dataset == 'sample':
+            prepare_sample(work_dir)
+        else:
+            prepare_synthetic(work_dir, scale)
+
+        gap_rows = count_gap_rows(work_dir)
+        result = {
+            'engine': engine,
+            'dataset': dataset_name(dataset, scale),
+            'rows_per_sec': 0.0,
+            'seconds': 0.0,
+            'peak_rss_kb': 0,
+            'differences': [],
+        }
+        runs = []
+
+        for _ in range(repeat if dataset in THROUGHPUT_DATASETS else 1):
+            if engine in RESUMED_ENGINES:
+                run = run_resumed(command, work_dir, RESUMED_ENGINES[engine])
+                if run is None:
+                    result['differences'].append('finished before its first checkpoint, resume not exercised')
+                    return result
+            else:
+                run = run_engine(command, work_dir)
+
+            runs.append(run)
+            if run[0] != 0:
+                break
+
+        exit_code = runs[-1][0]
+        elapsed = min(run[1] for run in runs)
+        result['seconds'] = elapsed
+        result['rows_per_sec'] = gap_rows / elapsed if elapsed else 0.0
+        result['peak_rss_kb'] = min(run[2] for run in runs)
+
+        if exit_code != 0:
+            with open(os.path.join(work_dir, 'engine.log'), 'r', encoding='utf-8') as f:
+                result['differences'].append(f'exit code {exit_code}: {f.read()[-500:]}')
+            return result
+
+        for output_file in OUTPUT_FILES:
+            actual_file = os.path.join(work_dir, output_file)
+            golden_file = os.path.join(golden_dir, output_file)
+
+            # Outputs an engine never writes (v1 has no match report) have no golden file
+            if not os.path.exists(actual_file):
+                if os.path.exists(golden_file):
+                    result['differences'].append(f'{output_file}: not written by the engine')
+                continue
+
+            if update:
+                os.makedirs(golden_dir, exist_ok=True)
+                shutil.copy(actual_file, golden_file)
+            elif not os.path.exists(golden_file):
+                result['differences'].append(f'{output_file}: no golden file (run with --update)')
+            else:
+                result['differences'] += [f'{output_file} {d}' for d in diff_csv(actual_file, golden_file)]
+
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_stemming() -> List[str]:
+    """Paradigms in STEM_PARADIGMS that stem_word splits into several stems"""
+    differences = []
+
+    for forms in STEM_PARADIGMS:
+        stems = {form: stem_word(form) for form in forms}
+        if len(set(stems.values())) > 1:
+            differences.append('stems differ: ' + ', '.join(f'{form} → {stem}' for form, stem in stems.items()))
+
+    return differences
+
+
+def load_baseline() -> Dict:
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+
+    with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results: List[Dict], baseline: Dict):
+    for result in results:
+        baseline.setdefault(result['engine'], {})[result['dataset']] = {
+            'rows_per_sec': round(result['rows_per_sec'], 1),
+            'peak_rss_kb': result['peak_rss_kb'],
+        }
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Golden-output and throughput regression gate')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=DATASETS)
+    parser.add_argument('--scale', type=int, default=3, help='Synthetic dataset scale factor')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per engine on throughput datasets (the best run counts)')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='Allowed throughput drop vs baseline (0.3 = 30%%)')
+    parser.add_argument('--update', action='store_true',
+                        help='Rewrite golden files and the throughput baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function"""
+    args = parse_args(argv)
+
+    print("="*70)
+    print("REGRESSION GATE")
+    print("="*70)
+
+    baseline = load_baseline()
+    results = []
+
+    differences = check_stemming()
+    print(f"  {'stem_word':<16} {len(STEM_PARADIGMS)} paradigms")
+    for difference in differences:
+        print(f"    ✗ {difference}")
+    failures = bool(differences)
+
+    for dataset in args.datasets:
+        for engine in args.engines:
+            result = check_engine(engine, dataset, args.scale, args.repeat, args.update)
+            results.append(result)
+
+            reference = baseline.get(engine, {}).get(result['dataset'])
+            line = (f"  {engine:<16} {result['dataset']:<13} {result['rows_per_sec']:9.1f} rows/s "
+                    f"{result['peak_rss_kb'] / 1024:7.1f} MB")
+
+            if reference and dataset in THROUGHPUT_DATASETS and not args.update:
+                speed_delta = result['rows_per_sec'] / reference['rows_per_sec'] - 1
+                rss_delta = result['peak_rss_kb'] / reference['peak_rss_kb'] - 1
+                line += f"  ({speed_delta:+.0%} throughput, {rss_delta:+.0%} RSS)"
+
+                if speed_delta < -args.tolerance:
+                    result['differences'].append(
+                        f"throughput dropped {-speed_delta:.0%} (tolerance {args.tolerance:.0%})")
+
+            print(line)
+
+            for difference in result['differences']:
+                print(f"    ✗ {difference}")
+
+            failures += bool(result['differences'])
+
+    if args.update:
+        save_baseline(results, baseline)
+        print(f"\n  ✓ Golden files and baseline updated in {GOLDEN_DIR}")
+
+    print("\n" + "="*70)
+    print("REGRESSION GATE " + ("FAILED" if failures else "PASSED"))
+    print("="*70)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())